@@ -0,0 +1,239 @@
+import argparse
+import datetime
+import json
+import os
+import re
+import time
+from typing import Tuple
+from urllib.parse import urlencode
+
+import asyncpg
+from aiohttp import web
+
+import metrics
+import postgres as pg
+
+
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+NDJSON = 'application/x-ndjson'
+STREAM_BUFFER_SIZE = 64 * 1024
+
+PLACEHOLDER = re.compile(r'%%|%\((\w+)\)s|%s')
+
+
+def to_asyncpg(query: str, params) -> Tuple[str, list]:
+    """
+    Converts a psycopg2 query with named or positional parameters
+    to `$n` placeholders and the list of arguments.
+    """
+    args = []
+    numbers = {}
+    positional = iter(params) if isinstance(params, (list, tuple)) else None
+
+    def replace(match):
+        if match.group(0) == '%%':
+            return '%'
+        name = match.group(1)
+        if name is None:
+            args.append(next(positional))
+            return f'${len(args)}'
+        if name not in numbers:
+            args.append(params[name])
+            numbers[name] = len(args)
+        return f'${numbers[name]}'
+
+    return PLACEHOLDER.sub(replace, query), args
+
+
+def parse_date(value):
+    if value is None:
+        return None
+    return datetime.date.fromisoformat(value)
+
+
+def parse_limit(request: web.Request) -> int:
+    try:
+        limit = int(request.query.get('limit', PAGE_SIZE))
+    except ValueError:
+        raise web.HTTPBadRequest(text='Invalid query parameters.')
+    if not 0 < limit <= MAX_PAGE_SIZE:
+        raise web.HTTPBadRequest(text=f'limit must be 1..{MAX_PAGE_SIZE}.')
+    return limit
+
+
+def next_link(request: web.Request, **changes) -> dict:
+    query = urlencode(dict(request.query.items(), **changes))
+    return {'Link': f'<{request.url.with_query(None)}?{query}>; rel="next"'}
+
+
+async def list_posts(request: web.Request) -> web.StreamResponse:
+    """
+    Same contract as `server.PostAPI.list_posts`.
+    """
+    args = request.query
+    limit = parse_limit(request)
+    try:
+        after = args.get('after')
+        after = None if after is None else pg.decode_cursor(after)
+        filters = {
+            'post_category': args.get('post_category'),
+            'username': args.get('username'),
+            'date_from': parse_date(args.get('date_from')),
+            'date_to': parse_date(args.get('date_to')),
+        }
+    except ValueError:
+        raise web.HTTPBadRequest(text='Invalid query parameters.')
+    query, params = pg.filter_posts(after, **filters)
+
+    if args.get('format') == 'ndjson' or request.headers.get(
+        'Accept', ''
+    ).startswith(NDJSON):
+        return await stream_posts(request, *to_asyncpg(query + ';', params))
+
+    params['limit'] = limit + 1
+    sql, values = to_asyncpg(query + ' LIMIT %(limit)s;', params)
+    async with request.app['pool'].acquire() as conn:
+        rows = await conn.fetch(sql, *values)
+    headers = {}
+    if len(rows) > limit:
+        headers = next_link(
+            request, after=pg.encode_cursor(rows[limit - 1])
+        )
+    return web.json_response(
+        [pg.row_to_post(row) for row in rows[:limit]], headers=headers
+    )
+
+
+async def stream_posts(
+    request: web.Request, sql: str, values: list
+) -> web.StreamResponse:
+    """
+    Streams rows of a server side cursor as NDJSON.
+    """
+    response = web.StreamResponse(headers={'Content-Type': NDJSON})
+    await response.prepare(request)
+    buffer = []
+    size = 0
+    async with request.app['pool'].acquire() as conn:
+        async with conn.transaction():
+            async for row in conn.cursor(sql, *values, prefetch=1000):
+                line = json.dumps(pg.row_to_post(row)) + '\n'
+                buffer.append(line)
+                size += len(line)
+                if size >= STREAM_BUFFER_SIZE:
+                    await response.write(''.join(buffer).encode())
+                    buffer = []
+                    size = 0
+    await response.write(''.join(buffer).encode())
+    await response.write_eof()
+    return response
+
+
+async def get_post(request: web.Request) -> web.Response:
+    # asyncpg prepares and caches statements per connection
+    sql, values = to_asyncpg(
+        pg.PREPARED['post_by_uuid'], [request.match_info['post_id']]
+    )
+    async with request.app['pool'].acquire() as conn:
+        row = await conn.fetchrow(sql, *values)
+    if row is None:
+        raise web.HTTPNotFound()
+    return web.json_response(pg.row_to_post(row))
+
+
+async def search(request: web.Request) -> web.Response:
+    """
+    Same contract as `server.search`.
+    """
+    limit = parse_limit(request)
+    try:
+        offset = int(request.query.get('offset', 0))
+    except ValueError:
+        raise web.HTTPBadRequest(text='Invalid query parameters.')
+    if offset < 0:
+        raise web.HTTPBadRequest(text='offset must not be negative.')
+    terms = {
+        key: request.query.get(key)
+        for key in ('q', 'post_category', 'username')
+    }
+    try:
+        query, params = pg.search_query(limit + 1, offset, **terms)
+    except ValueError:
+        raise web.HTTPBadRequest(text='No search terms.')
+    async with request.app['pool'].acquire() as conn:
+        rows = await conn.fetch(*to_asyncpg(query, params))
+    headers = {}
+    if len(rows) > limit:
+        headers = next_link(request, offset=offset + limit)
+    return web.json_response(
+        [pg.row_to_post(row) for row in rows[:limit]], headers=headers
+    )
+
+
+async def metrics_view(request: web.Request) -> web.Response:
+    return web.Response(
+        text=metrics.registry.render(), content_type='text/plain'
+    )
+
+
+@web.middleware
+async def observe_latency(request: web.Request, handler):
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await handler(request)
+        status = response.status
+        return response
+    except web.HTTPException as e:
+        status = e.status
+        raise
+    finally:
+        # streamed responses are measured to the end of the stream
+        route = request.match_info.route.resource
+        metrics.observe(
+            'http_request_duration_seconds',
+            time.perf_counter() - start,
+            route=route.canonical if route else 'unmatched',
+            method=request.method,
+            status=status,
+        )
+
+
+async def create_pool(app: web.Application):
+    config = pg.db_config()
+    config['database'] = config.pop('dbname')
+    app['pool'] = await asyncpg.create_pool(
+        min_size=int(os.environ.get('REDDITDB_POOL_MIN', 1)),
+        max_size=int(os.environ.get('REDDITDB_POOL_MAX', 10)),
+        **config,
+    )
+
+
+async def close_pool(app: web.Application):
+    await app['pool'].close()
+
+
+def create_app() -> web.Application:
+    """
+    Read routes of `server.app` on asyncpg, writes stay
+    with the Flask server. Configured by the same REDDITDB_* variables.
+    """
+    app = web.Application(middlewares=[observe_latency])
+    app.on_startup.append(create_pool)
+    app.on_cleanup.append(close_pool)
+    app.add_routes([
+        web.get('/posts/', list_posts),
+        web.get('/posts/search', search),
+        web.get('/posts/{post_id}', get_post),
+        web.get('/metrics', metrics_view),
+    ])
+    return app
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Async posts API')
+    arg_parser.add_argument('--host', default='127.0.0.1')
+    arg_parser.add_argument('--port', type=int, default=8080)
+    args = arg_parser.parse_args()
+    web.run_app(create_app(), host=args.host, port=args.port)
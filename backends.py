@@ -0,0 +1,38 @@
+from typing import Iterator, List, Optional
+
+from cache import UserInfo
+
+
+class FetchBackend:
+    """
+    Source of feed posts and user profiles for RedditParser.
+    `get_user_info` is called from the parser worker pool,
+    so it must be thread-safe.
+    """
+
+    def iter_feed(self, incremental: bool = True) -> Iterator[List[dict]]:
+        """
+        Yields batches of feed posts as dicts with `url`, `username`,
+        `post_category`, `comments_number`, `votes_number` and
+        `post_date` keys. Batch items are None for feed entries
+        which are not posts or belong to deleted users.
+        Stops when the feed is exhausted.
+        """
+        raise NotImplementedError
+
+    def get_user_info(self, username: str) -> Optional[UserInfo]:
+        """
+        Returns user karma, cakeday, post karma and comment karma,
+        `cache.UNAVAILABLE` if the profile is not available (e.g. 18+)
+        or None if it could not be loaded.
+        """
+        raise NotImplementedError
+
+    def stats(self) -> List[str]:
+        """
+        Returns lines of backend specific statistics.
+        """
+        return []
+
+    def close(self):
+        pass
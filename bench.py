@@ -0,0 +1,259 @@
+import argparse
+import json
+import os
+import subprocess
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from typing import Callable, Iterator, List, Optional
+
+from backends import FetchBackend
+from cache import UserInfo
+from extractors import (
+    LxmlExtractor,
+    PostExtractor,
+    ProfileExtractor,
+    SoupExtractor,
+    get_extractor,
+)
+from fixtures import Capture, ReplayBackend
+from parser import RedditParser
+
+
+def make_post_html(i: int) -> str:
+    """
+    Builds a synthetic feed post with the same classes
+    and roughly the same nesting as reddit markup.
+    """
+    c = PostExtractor
+    padding = '<div class="_1poyrkZ7g36PawDueRza-J"><span>x</span></div>' * 20
+    comments = f'{i % 9}.{i % 10}k comments'
+    return f'''
+        <div class="_1oQyIsiPHYt6nx7VOmd1sz">
+          {padding}
+          <div class="{c.VOTES_NUMBER_CLASS}">{i % 90 + 1}k</div>
+          <div class="_2FCtq-QzlfuN-SwVMUZMM3">
+            <a class="{c.POST_CATEGORY_CLASS}" href="/r/sub{i % 7}/">r/sub</a>
+            <a class="{c.USER_URL_CLASS}" href="/user/user_{i}/">u/user</a>
+            <a class="{c.POST_DATE_CLASS}" href="#">{i % 23 + 1} hours ago</a>
+          </div>
+          {padding}
+          <a class="{c.POST_URL_CLASS}"
+             href="/r/sub{i % 7}/comments/{i:x}/post_{i}/">post</a>
+          <span class="{c.COMMENT_NUMBER_CLASS}">{comments}</span>
+          {padding}
+        </div>
+    '''
+
+
+def make_profile_html(i: int) -> str:
+    c = ProfileExtractor
+    return f'''
+        <html><body>
+          <span id="{c.KARMA_SPAN_ID}">{i * 1000 + 7:,}</span>
+          <span id="{c.CAKEDAY_SPAN_ID}">March {i % 28 + 1}, 2015</span>
+          <div class="{c.KARMA_POPUP_CLASS}">{i * 900:,} Post Karma
+{i * 100 + 7:,} Comment Karma</div>
+        </body></html>
+    '''
+
+
+def make_fixtures(directory: str, num_posts: int, batch_size: int = 25):
+    """
+    Writes synthetic feed and profiles in Capture layout.
+    """
+    capture = Capture(directory)
+    for start in range(0, num_posts, batch_size):
+        capture.save_feed([
+            make_post_html(i)
+            for i in range(start, min(start + batch_size, num_posts))
+        ])
+    for i in range(num_posts):
+        capture.save_profile(f'user_{i}', make_profile_html(i))
+
+
+class TimedBackend(FetchBackend):
+    """
+    Measures time spent in feed and profile stages of wrapped backend.
+    Profile time is summed over worker threads.
+    """
+
+    def __init__(self, backend: FetchBackend):
+        self.backend = backend
+        self.stage_time = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def iter_feed(self, incremental: bool = True) -> Iterator[List[dict]]:
+        feed = self.backend.iter_feed(incremental)
+        while True:
+            start = time.perf_counter()
+            batch = next(feed, None)
+            self._add('feed', time.perf_counter() - start)
+            if batch is None:
+                return
+            yield batch
+
+    def get_user_info(self, username: str) -> Optional[UserInfo]:
+        start = time.perf_counter()
+        try:
+            return self.backend.get_user_info(username)
+        finally:
+            self._add('profile', time.perf_counter() - start)
+
+    def close(self):
+        self.backend.close()
+
+    def _add(self, stage: str, seconds: float):
+        with self._lock:
+            self.stage_time[stage] += seconds
+
+
+def time_per_item(func: Callable, items: list, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for item in items:
+            func(item)
+        best = min(best, time.perf_counter() - start)
+    return best / len(items)
+
+
+def bench_extractors(num_posts: int, repeat: int) -> dict:
+    """
+    Returns per-post parse and extract time of every extractor
+    and time of every SoupExtractor field getter.
+    """
+    posts_html = [make_post_html(i) for i in range(num_posts)]
+    results = {}
+    for extractor in (SoupExtractor(), LxmlExtractor()):
+        name = type(extractor).__name__
+        nodes = extractor.from_fragments(posts_html)
+        results[f'{name}.parse'] = time_per_item(
+            lambda html: extractor.from_fragments([html]), posts_html, repeat
+        )
+        results[f'{name}.extract'] = time_per_item(
+            extractor.extract, nodes, repeat
+        )
+
+    extractor = SoupExtractor()
+    nodes = extractor.from_fragments(posts_html)
+    for getter in (
+        '_get_post_url',
+        '_get_post_username',
+        '_get_post_category',
+        '_get_comments_number',
+        '_get_votes_number',
+        '_get_post_date',
+    ):
+        results[f'SoupExtractor.{getter}'] = time_per_item(
+            getattr(extractor, getter), nodes, repeat
+        )
+    return results
+
+
+def bench_crawl(
+    directory: str, num_posts: int, num_workers: int, engine: str
+) -> dict:
+    """
+    Runs get_posts_data over replayed pages.
+    """
+    backend = TimedBackend(
+        ReplayBackend(directory, extractor=get_extractor(engine))
+    )
+    parser = RedditParser(directory, num_workers, backend=backend)
+    tracemalloc.start()
+    start = time.perf_counter()
+    posts = parser.get_posts_data(num_posts)
+    total = time.perf_counter() - start
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'posts': len(posts),
+        'posts_per_sec': len(posts) / total,
+        'total_time': total,
+        'feed_time': backend.stage_time['feed'],
+        'profile_time': backend.stage_time['profile'],
+        'peak_memory': peak_memory,
+    }
+
+
+def git_version() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'describe', '--always', '--dirty'],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def load_results(filename: str) -> List[dict]:
+    if not os.path.exists(filename):
+        return []
+    with open(filename) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def compare(previous: dict, current: dict) -> List[str]:
+    """
+    Returns relative change of every metric against previous run.
+    """
+    lines = []
+    for name, value in current['metrics'].items():
+        old = previous['metrics'].get(name)
+        if old:
+            lines.append(
+                f'{name}: {old:.6g} -> {value:.6g} '
+                f'({(value - old) / old:+.1%})'
+            )
+    return lines
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Parser benchmarks')
+    arg_parser.add_argument('--posts', type=int, default=500)
+    arg_parser.add_argument('--repeat', type=int, default=5)
+    arg_parser.add_argument('--workers', type=int, default=4)
+    arg_parser.add_argument('--engine', default='lxml')
+    arg_parser.add_argument(
+        '--fixtures', metavar='DIR',
+        help='captured pages to replay, synthetic ones by default'
+    )
+    arg_parser.add_argument(
+        '--results', default='bench-results.ndjson',
+        help='file to append results to'
+    )
+    args = arg_parser.parse_args()
+
+    metrics = {
+        f'extractors.{name}': seconds
+        for name, seconds in bench_extractors(args.posts, args.repeat).items()
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        if args.fixtures is None:
+            make_fixtures(directory, args.posts)
+        crawl = bench_crawl(
+            args.fixtures or directory, args.posts, args.workers, args.engine
+        )
+    metrics.update({f'crawl.{name}': value for name, value in crawl.items()})
+
+    result = {
+        'version': git_version(),
+        'timestamp': time.time(),
+        'params': vars(args),
+        'metrics': metrics,
+    }
+    for name, value in metrics.items():
+        print(f'{name}: {value:.6g}')
+
+    previous = [
+        r for r in load_results(args.results)
+        if r['version'] != result['version']
+    ]
+    if previous:
+        print(f"Compared to {previous[-1]['version']}:")
+        print(*compare(previous[-1], result), sep='\n')
+    with open(args.results, 'a') as f:
+        f.write(json.dumps(result) + '\n')
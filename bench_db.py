@@ -0,0 +1,147 @@
+import argparse
+import json
+import time
+from typing import Callable, List
+
+import postgres as pg
+from bench import git_version
+
+
+def seed(cursor, num_posts: int, posts_per_user: int = 10):
+    """
+    Creates schema `bench_<num_posts>` with synthetic posts
+    and makes it the current one, followed by public.
+    """
+    schema = f'bench_{num_posts}'
+    cursor.execute(f'DROP SCHEMA IF EXISTS {schema} CASCADE;')
+    cursor.execute(f'CREATE SCHEMA {schema};')
+    # pg_trgm stays in public, so dropping the schema keeps it
+    cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm SCHEMA public;')
+    cursor.execute(f'SET search_path TO {schema}, public;')
+    pg.create_users(cursor)
+    pg.create_posts(cursor)
+    num_users = max(num_posts // posts_per_user, 1)
+    cursor.execute('''
+        INSERT INTO users (
+            name,
+            total_karma,
+            cake_day,
+            post_karma,
+            comment_karma
+        )
+        SELECT
+            'user_' || i,
+            i * 3,
+            date '2015-01-01' + i %% 3000,
+            i * 2,
+            i
+        FROM generate_series(1, %s) AS i;
+    ''', [num_users])
+    cursor.execute('''
+        INSERT INTO posts (
+            uuid,
+            url,
+            user_id,
+            post_date,
+            comments,
+            votes,
+            category
+        )
+        SELECT
+            md5(i::text),
+            'https://www.reddit.com/r/bench/comments/' || i,
+            1 + i %% %s,
+            date '2021-01-01' + i %% 365,
+            i %% 1000,
+            i %% 100000,
+            'category_' || i %% 50
+        FROM generate_series(1, %s) AS i;
+    ''', [num_users, num_posts])
+    cursor.execute('ANALYZE;')
+
+
+def get_all_data_per_row(cursor) -> List[dict]:
+    """
+    Previous read path with one users query per post.
+    """
+    cursor.execute('SELECT * FROM posts;')
+    data = []
+    for row in cursor.fetchall():
+        cursor.execute('SELECT * FROM users WHERE id = %s;', [row[2]])
+        user = cursor.fetchone()
+        data.append({
+            'post_uuid': row[0],
+            'url': row[1],
+            'post_date': row[3].strftime('%d-%m-%y'),
+            'comments_number': row[4],
+            'votes_number': row[5],
+            'post_category': row[6],
+            'username': user[1],
+            'user_karma': user[2],
+            'user_cakeday': user[3].strftime('%d-%m-%y'),
+            'post_karma': user[4],
+            'comment_karma': user[5],
+        })
+    return data
+
+
+def best_time(func: Callable, cursor, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(cursor)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(
+        description='Benchmarks reading all posts from postgres'
+    )
+    arg_parser.add_argument(
+        '--sizes', type=int, nargs='+', default=[1000, 100000, 1000000]
+    )
+    arg_parser.add_argument('--repeat', type=int, default=3)
+    arg_parser.add_argument(
+        '--per-row-limit', type=int, default=1000000,
+        help='skip the per row read path for larger tables'
+    )
+    arg_parser.add_argument('--user', default='')
+    arg_parser.add_argument('--password', default='')
+    arg_parser.add_argument(
+        '--results', default='bench-results.ndjson',
+        help='file to append results to'
+    )
+    arg_parser.add_argument(
+        '--keep', action='store_true', help='keep seeded schemas'
+    )
+    args = arg_parser.parse_args()
+
+    conn = pg.connect_to_redditdb(args.user, args.password)
+    cursor = conn.cursor()
+    metrics = {}
+    for size in args.sizes:
+        seed(cursor, size)
+        conn.commit()
+        metrics[f'db.join.{size}'] = best_time(
+            pg.get_all_data, cursor, args.repeat
+        )
+        if size <= args.per_row_limit:
+            metrics[f'db.per_row.{size}'] = best_time(
+                get_all_data_per_row, cursor, args.repeat
+            )
+        if not args.keep:
+            cursor.execute(f'DROP SCHEMA bench_{size} CASCADE;')
+            conn.commit()
+    cursor.close()
+    conn.close()
+
+    for name, value in metrics.items():
+        print(f'{name}: {value:.6g}s')
+    with open(args.results, 'a') as f:
+        f.write(json.dumps({
+            'version': git_version(),
+            'timestamp': time.time(),
+            'params': vars(args),
+            'metrics': metrics,
+        }) + '\n')
@@ -0,0 +1,186 @@
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+
+UserInfo = Tuple[int, str, int, int]
+# profile known to be unavailable (e.g. 18+), cached like a profile
+UNAVAILABLE = ()
+
+
+class LRUCache:
+    """
+    Thread-safe size-bounded LRU mapping
+    with optional per-entry time to live.
+    """
+
+    def __init__(self, max_size: int, ttl: Optional[float] = None):
+        if max_size < 1:
+            raise ValueError('max_size must be positive')
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and self._expired(entry[1]):
+                del self._data[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key: Hashable, value: Any, stored_at: float = None):
+        with self._lock:
+            self._data[key] = (value, stored_at or time.time())
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def _expired(self, stored_at: float) -> bool:
+        return self.ttl is not None and time.time() - stored_at > self.ttl
+
+
+class UserInfoCache:
+    """
+    Cache of user profiles keyed by username.
+    Keeps recent users in memory and, if `path` is given,
+    all users in SQLite file, so it survives restarts.
+    Unavailable profiles are stored as `UNAVAILABLE`.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        ttl: float = 7 * 24 * 60 * 60,
+        max_size: int = 100000,
+        memory_size: int = 1000,
+    ):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._memory = LRUCache(memory_size, ttl)
+        self._lock = threading.Lock()
+        self._conn = None
+        # upper bound of rows on disk, eviction runs only above the cap
+        self._disk_size = 0
+        if path is not None:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS users (
+                    name TEXT PRIMARY KEY,
+                    user_karma INTEGER,
+                    user_cakeday TEXT,
+                    post_karma INTEGER,
+                    comment_karma INTEGER,
+                    fetched_at REAL
+                );
+            ''')
+            self._conn.execute('''
+                CREATE INDEX IF NOT EXISTS users_fetched_at
+                ON users (fetched_at);
+            ''')
+            self._conn.commit()
+            (self._disk_size,) = self._conn.execute(
+                'SELECT COUNT(*) FROM users;'
+            ).fetchone()
+
+    def get(self, username: str) -> Optional[UserInfo]:
+        user_info = self._memory.get(username)
+        if user_info is None and self._conn is not None:
+            user_info = self._get_from_disk(username)
+        with self._lock:
+            if user_info is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return user_info
+
+    def set(self, username: str, user_info: UserInfo):
+        now = time.time()
+        self._memory.set(username, user_info, now)
+        if self._conn is None:
+            return
+        with self._lock:
+            self._conn.execute('''
+                INSERT OR REPLACE INTO users
+                VALUES (?, ?, ?, ?, ?, ?);
+            ''', (username, *(user_info or (None,) * 4), now))
+            self._disk_size += 1
+            if self._disk_size > self.max_size:
+                self._evict()
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _get_from_disk(self, username: str) -> Optional[UserInfo]:
+        with self._lock:
+            row = self._conn.execute('''
+                SELECT user_karma, user_cakeday, post_karma,
+                       comment_karma, fetched_at
+                FROM users
+                WHERE name = ?;
+            ''', [username]).fetchone()
+            if row is None:
+                return None
+            if time.time() - row[4] > self.ttl:
+                self._conn.execute(
+                    'DELETE FROM users WHERE name = ?;', [username]
+                )
+                self._conn.commit()
+                return None
+        user_info = UNAVAILABLE if row[0] is None else tuple(row[:4])
+        self._memory.set(username, user_info, row[4])
+        return user_info
+
+    def _evict(self):
+        # drop expired users first, then the oldest ones
+        # down to 90% of the cap, so eviction runs once per many inserts
+        self._conn.execute(
+            'DELETE FROM users WHERE fetched_at < ?;',
+            [time.time() - self.ttl]
+        )
+        (size,) = self._conn.execute('SELECT COUNT(*) FROM users;').fetchone()
+        keep = self.max_size - self.max_size // 10
+        if size > keep:
+            self._conn.execute('''
+                DELETE FROM users WHERE name IN (
+                    SELECT name FROM users
+                    ORDER BY fetched_at
+                    LIMIT ?
+                );
+            ''', [size - keep])
+            size = keep
+        self._disk_size = size
@@ -0,0 +1,231 @@
+import argparse
+import os
+import secrets
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+from typing import Optional, Tuple
+
+from cache import UserInfoCache
+from driver_pool import DriverPool
+from parser import RedditParser
+from selenium_backend import SeleniumBackend
+from writers import get_writer
+
+
+ADDRESS = ('127.0.0.1', 6010)
+AUTHKEY_FILE = os.path.expanduser('~/.reddit-parser-authkey')
+OUTPUT_DIR = os.environ.get('REDDIT_PARSER_OUTPUT_DIR', 'output')
+
+
+def load_authkey(create: bool = False, path: str = AUTHKEY_FILE) -> bytes:
+    """
+    Returns the socket secret from REDDIT_PARSER_AUTHKEY or `path`,
+    which must be readable only by its owner.
+    With `create` a missing file is generated.
+    Jobs are unpickled, so the key must never be shared.
+    """
+    key = os.environ.get('REDDIT_PARSER_AUTHKEY')
+    if key:
+        return key.encode()
+    if create and not os.path.exists(path):
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            f.write(secrets.token_hex(32))
+    if not os.path.exists(path):
+        raise RuntimeError(
+            f'No auth key: set REDDIT_PARSER_AUTHKEY or create {path}'
+        )
+    info = os.stat(path)
+    if info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise RuntimeError(f'{path} must be readable only by its owner')
+    with open(path) as f:
+        key = f.read().strip()
+    if not key:
+        raise RuntimeError(f'{path} is empty')
+    return key.encode()
+
+
+class CrawlDaemon:
+    """
+    Long-running crawler keeping a pool of warm browsers.
+    Jobs are dicts received over a local socket:
+    `{'link': ..., 'num_posts': ..., 'output': ..., 'format': 'csv'}`,
+    `{'command': 'stats'}` or `{'command': 'shutdown'}`.
+    Job outputs are file names inside `output_dir`.
+    """
+
+    def __init__(
+        self,
+        pool: DriverPool,
+        max_jobs: int = 1,
+        profile_workers: int = 1,
+        user_cache: Optional[UserInfoCache] = None,
+        output_dir: str = OUTPUT_DIR,
+    ):
+        if pool.size < max_jobs * (profile_workers + 1):
+            raise ValueError('Driver pool is too small for max_jobs')
+        self.pool = pool
+        self.profile_workers = profile_workers
+        self.user_cache = user_cache or UserInfoCache()
+        self.output_dir = os.path.realpath(output_dir)
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.max_jobs = max_jobs
+        self.jobs_done = 0
+        self.address = ADDRESS
+        self.authkey = None
+        self._slots = threading.Semaphore(max_jobs)
+        self._stop = threading.Event()
+
+    def serve_forever(
+        self,
+        address: Tuple[str, int] = ADDRESS,
+        authkey: Optional[bytes] = None,
+    ):
+        """
+        Without `authkey` the key is loaded or generated
+        by `load_authkey`. Returns after shutdown once running jobs
+        are finished, so their browsers and outputs stay intact.
+        """
+        self.address = address
+        self.authkey = authkey or load_authkey(create=True)
+        with Listener(address, authkey=self.authkey) as listener:
+            while not self._stop.is_set():
+                conn = listener.accept()
+                threading.Thread(
+                    target=self._handle, args=(conn,), daemon=True
+                ).start()
+        # every job holds a slot, so taking all of them waits for the jobs
+        for _ in range(self.max_jobs):
+            self._slots.acquire()
+        for _ in range(self.max_jobs):
+            self._slots.release()
+
+    def run_job(self, job: dict) -> dict:
+        start = time.time()
+        try:
+            output = self.output_path(job.get('output') or (
+                f"reddit-{time.strftime('%Y%m%d%H%M%S')}.csv"  # noqa: E228
+            ))
+            backend = SeleniumBackend(
+                job['link'], self.profile_workers, driver_pool=self.pool
+            )
+            with RedditParser(
+                job['link'],
+                num_workers=self.profile_workers,
+                user_cache=self.user_cache,
+                backend=backend,
+            ) as parser, get_writer(
+                job.get('format', 'csv'), output, RedditParser.DATA_ORDER
+            ) as writer:
+                for post in parser.iter_posts(job['num_posts']):
+                    writer.write(post)
+        except Exception as e:
+            return {'status': 'error', 'error': repr(e)}
+        self.jobs_done += 1
+        return {
+            'status': 'ok',
+            'posts': writer.rows_written,
+            'output': output,
+            'elapsed': time.time() - start,
+        }
+
+    def output_path(self, name: str) -> str:
+        """
+        Returns path of output `name` refusing paths
+        which lead out of `output_dir`.
+        """
+        path = os.path.realpath(os.path.join(self.output_dir, name))
+        if os.path.commonpath([path, self.output_dir]) != self.output_dir:
+            raise ValueError(f'Output must be inside {self.output_dir}')
+        return path
+
+    def stats(self) -> dict:
+        return {
+            'jobs_done': self.jobs_done,
+            'drivers': self.pool.size,
+            'drivers_recycled': self.pool.recycled,
+            'user_cache': self.user_cache.stats(),
+        }
+
+    def _handle(self, conn):
+        with conn:
+            try:
+                job = conn.recv()
+            except EOFError:  # wake up connection
+                return
+            command = job.get('command', 'crawl')
+            if command == 'stats':
+                conn.send(self.stats())
+            elif command == 'shutdown':
+                self._stop.set()
+                conn.send({'status': 'ok'})
+                # wake up accept() so the loop sees the stop flag
+                Client(self.address, authkey=self.authkey).close()
+            else:
+                with self._slots:
+                    if self._stop.is_set():
+                        conn.send({'status': 'error', 'error': 'shutdown'})
+                    else:
+                        conn.send(self.run_job(job))
+
+
+def submit(
+    job: dict,
+    address: Tuple[str, int] = ADDRESS,
+    authkey: Optional[bytes] = None,
+) -> dict:
+    """
+    Sends a job to the daemon and waits for its result.
+    """
+    with Client(address, authkey=authkey or load_authkey()) as conn:
+        conn.send(job)
+        return conn.recv()
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Crawl daemon')
+    commands = arg_parser.add_subparsers(dest='command', required=True)
+    serve = commands.add_parser('serve')
+    serve.add_argument('--jobs', type=int, default=1)
+    serve.add_argument('--workers', type=int, default=2)
+    serve.add_argument('--max-pages', type=int, default=500)
+    serve.add_argument('--max-rss-mb', type=int, default=1024)
+    serve.add_argument(
+        '--output-dir', default=OUTPUT_DIR,
+        help='directory of job outputs'
+    )
+    crawl = commands.add_parser('crawl')
+    crawl.add_argument('link')
+    crawl.add_argument('num_posts', type=int)
+    crawl.add_argument(
+        '--output', help='file name inside the daemon output directory'
+    )
+    crawl.add_argument('--format', default='csv')
+    commands.add_parser('stats')
+    commands.add_parser('shutdown')
+    args = arg_parser.parse_args()
+
+    if args.command == 'serve':
+        # fail before starting browsers
+        authkey = load_authkey(create=True)
+        with DriverPool(
+            args.jobs * (args.workers + 1),
+            max_pages=args.max_pages,
+            max_rss=args.max_rss_mb * 1024 ** 2,
+        ) as pool:
+            daemon = CrawlDaemon(
+                pool, args.jobs, args.workers,
+                UserInfoCache('users-cache.sqlite3'),
+                args.output_dir,
+            )
+            daemon.serve_forever(authkey=authkey)
+    elif args.command == 'crawl':
+        print(submit({
+            'link': args.link,
+            'num_posts': args.num_posts,
+            'output': args.output,
+            'format': args.format,
+        }))
+    else:
+        print(submit({'command': args.command}))
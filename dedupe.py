@@ -0,0 +1,57 @@
+import csv
+import os
+import threading
+from typing import Iterable, Optional
+
+
+class SeenIndex:
+    """
+    Set of seen post urls.
+    If `path` is given, urls are appended to that file,
+    so the next crawl starts from the already seen ones.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._urls = set()
+        self._lock = threading.Lock()
+        self._file = None
+        if path is not None:
+            if os.path.exists(path):
+                with open(path) as f:
+                    self._urls.update(line.rstrip('\n') for line in f)
+            self._file = open(path, 'a')
+
+    def __contains__(self, url: str) -> bool:
+        return url in self._urls
+
+    def __len__(self) -> int:
+        return len(self._urls)
+
+    def add(self, url: str):
+        with self._lock:
+            if url in self._urls:
+                return
+            self._urls.add(url)
+            if self._file is not None:
+                self._file.write(url + '\n')
+
+    def update(self, urls: Iterable[str]):
+        for url in urls:
+            self.add(url)
+
+    def load_csv(self, filename: str, sep: str = ';'):
+        """
+        Marks urls from a previous parser output as seen.
+        """
+        with open(filename, newline='') as f:
+            self.update(row['url'] for row in csv.DictReader(f, delimiter=sep))
+
+    def flush(self):
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
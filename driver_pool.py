@@ -0,0 +1,123 @@
+import queue
+import threading
+from typing import Callable, Optional
+
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+
+try:
+    import psutil
+except ImportError:  # memory based recycling is disabled
+    psutil = None
+
+
+# geckodriver waits 300s for a page by default
+PAGE_LOAD_TIMEOUT = 30.0
+
+
+def create_driver(
+    page_load_timeout: float = PAGE_LOAD_TIMEOUT,
+) -> webdriver.Firefox:
+    options = webdriver.FirefoxOptions()
+    options.add_argument('--headless')
+    driver = webdriver.Firefox(options=options)
+    driver.set_page_load_timeout(page_load_timeout)
+    return driver
+
+
+class DriverPool:
+    """
+    Pool of warm headless browsers shared by crawl jobs.
+    Drivers are health-checked when taken and recycled
+    after `max_pages` page loads or when browser RSS
+    exceeds `max_rss` bytes.
+    """
+
+    def __init__(
+        self,
+        size: int,
+        max_pages: int = 500,
+        max_rss: Optional[int] = 1024 ** 3,
+        factory: Callable[[], webdriver.Firefox] = create_driver,
+    ):
+        self.size = size
+        self.max_pages = max_pages
+        self.max_rss = max_rss
+        self.factory = factory
+        self.recycled = 0
+        self._pages = {}
+        self._lock = threading.Lock()
+        self._drivers = queue.Queue()
+        for _ in range(size):
+            self._drivers.put(self._create())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def acquire(self, timeout: Optional[float] = None) -> webdriver.Firefox:
+        driver = self._drivers.get(timeout=timeout)
+        if not self._healthy(driver):
+            driver = self._replace(driver)
+        return driver
+
+    def release(self, driver: webdriver.Firefox):
+        if self._worn_out(driver):
+            driver = self._replace(driver)
+        self._drivers.put(driver)
+
+    def count_page(self, driver: webdriver.Firefox):
+        with self._lock:
+            self._pages[id(driver)] = self._pages.get(id(driver), 0) + 1
+
+    def close(self):
+        while not self._drivers.empty():
+            self._quit(self._drivers.get_nowait())
+
+    def _create(self) -> webdriver.Firefox:
+        driver = self.factory()
+        with self._lock:
+            self._pages[id(driver)] = 0
+        return driver
+
+    def _replace(self, driver: webdriver.Firefox) -> webdriver.Firefox:
+        self._quit(driver)
+        self.recycled += 1
+        return self._create()
+
+    def _quit(self, driver: webdriver.Firefox):
+        with self._lock:
+            self._pages.pop(id(driver), None)
+        try:
+            driver.quit()
+        except WebDriverException:
+            pass  # browser is already dead
+
+    @staticmethod
+    def _healthy(driver: webdriver.Firefox) -> bool:
+        try:
+            return driver.execute_script('return 1;') == 1
+        except WebDriverException:
+            return False
+
+    def _worn_out(self, driver: webdriver.Firefox) -> bool:
+        if self._pages.get(id(driver), 0) >= self.max_pages:
+            return True
+        return self.max_rss is not None and browser_rss(driver) > self.max_rss
+
+
+def browser_rss(driver: webdriver.Firefox) -> int:
+    """
+    Returns RSS of geckodriver and browser processes it started,
+    0 if psutil is not installed.
+    """
+    if psutil is None:
+        return 0
+    try:
+        process = psutil.Process(driver.service.process.pid)
+        processes = [process] + process.children(recursive=True)
+        return sum(p.memory_info().rss for p in processes)
+    except (AttributeError, psutil.Error):
+        return 0
@@ -0,0 +1,266 @@
+import datetime
+from typing import Any, List, Optional, Tuple
+
+from bs4 import BeautifulSoup
+from bs4.element import Tag
+
+from cache import UNAVAILABLE, UserInfo
+import metrics
+
+try:
+    from lxml import etree
+    from lxml import html as lxml_html
+except ImportError:  # html.parser fallback is used
+    etree = None
+
+
+class PostExtractor:
+    """
+    Extracts post fields from feed post nodes.
+    Counts and dates are returned as raw page text,
+    they are converted in batches by `normalize`.
+    Subclasses define how nodes are parsed and searched.
+    """
+
+    POST_URL_CLASS = 'SQnoC3ObvgnGjWt90zD9Z'
+    USER_URL_CLASS = '_2tbHP6ZydRpjI44J3syuqC'
+    POST_CATEGORY_CLASS = '_3ryJoIoycVkA88fy40qNJc'
+    COMMENT_NUMBER_CLASS = 'FHCV02u6Cp2zYL0fhQPsO'
+    VOTES_NUMBER_CLASS = '_1rZYMD_4xY3gRcSS3p8ODO'
+    POST_DATE_CLASS = '_3jOxDPIQ0KaOWpzvSQo-1s'
+
+    def from_fragments(self, posts_html: List[str]) -> List[Any]:
+        """
+        Parses posts serialized one by one.
+        """
+        raise NotImplementedError
+
+    def from_page(self, page_source: str, block_class: str) -> List[Any]:
+        """
+        Parses the whole page and returns children of posts block.
+        """
+        raise NotImplementedError
+
+    def extract(self, post: Any) -> Optional[dict]:
+        """
+        Returns post fields or None for not a post
+        and posts of deleted users.
+        """
+        raise NotImplementedError
+
+
+class SoupExtractor(PostExtractor):
+    """
+    BeautifulSoup extractor on pure Python `html.parser`,
+    searches the post once per field.
+    """
+
+    def from_fragments(self, posts_html: List[str]) -> List[Tag]:
+        return [
+            BeautifulSoup(post_html, 'html.parser')
+            for post_html in posts_html
+        ]
+
+    def from_page(self, page_source: str, block_class: str) -> List[Tag]:
+        soup = BeautifulSoup(page_source, 'html.parser')
+        return soup.find('div', class_=block_class).contents
+
+    def extract(self, post: Tag) -> Optional[dict]:
+        data = {}
+        data['url'] = self._get_post_url(post)
+        if data['url'] is None:  # not a post
+            return None
+        data['username'] = self._get_post_username(post)
+        if data['username'] is None:  # deleted user
+            metrics.inc('parser_posts_skipped_total', reason='deleted')
+            return None
+        data['post_category'] = self._get_post_category(post)
+        data['comments_number'] = self._get_comments_number(post)
+        data['votes_number'] = self._get_votes_number(post)
+        data['post_date'] = self._get_post_date(post)
+        return data
+
+    def _get_post_url(self, post: Tag) -> Optional[str]:
+        post_url_a = post.find('a', class_=self.POST_URL_CLASS)
+        if post_url_a is None:  # not a post
+            return None
+        return post_url_a.get('href')
+
+    def _get_post_username(self, post: Tag) -> Optional[str]:
+        user_url_a = post.find('a', class_=self.USER_URL_CLASS)
+        if user_url_a is None:  # not a post
+            return None
+        return href_name(user_url_a.get('href'))
+
+    def _get_post_category(self, post: Tag) -> Optional[str]:
+        post_category_a = post.find('a', class_=self.POST_CATEGORY_CLASS)
+        if post_category_a is None:  # not a post
+            return None
+        return href_name(post_category_a.get('href'))
+
+    def _get_comments_number(self, post: Tag) -> Optional[str]:
+        comment_number_div = post.find(
+            'span', class_=self.COMMENT_NUMBER_CLASS
+        )
+        if comment_number_div is None:  # not a post
+            return None
+        return comment_number_div.text
+
+    def _get_votes_number(self, post: Tag) -> Optional[str]:
+        votes_number_div = post.find('div', class_=self.VOTES_NUMBER_CLASS)
+        if votes_number_div is None:  # not a post
+            return None
+        return votes_number_div.text
+
+    def _get_post_date(self, post: Tag) -> Optional[str]:
+        post_date_a = post.find('a', class_=self.POST_DATE_CLASS)
+        if post_date_a is None:  # not a post
+            return None
+        return post_date_a.text
+
+
+class LxmlExtractor(PostExtractor):
+    """
+    lxml extractor, finds all post fields
+    in one pass of a precompiled XPath query.
+    """
+
+    def __init__(self):
+        if etree is None:
+            raise ImportError('lxml is required for LxmlExtractor')
+        # class name -> (tag, field)
+        self._fields = {
+            self.POST_URL_CLASS: ('a', 'url'),
+            self.USER_URL_CLASS: ('a', 'username'),
+            self.POST_CATEGORY_CLASS: ('a', 'post_category'),
+            self.COMMENT_NUMBER_CLASS: ('span', 'comments_number'),
+            self.VOTES_NUMBER_CLASS: ('div', 'votes_number'),
+            self.POST_DATE_CLASS: ('a', 'post_date'),
+        }
+        # single walk over elements that have a class at all,
+        # matching classes are looked up in `_fields`
+        self._query = etree.XPath('descendant-or-self::*[@class]')
+
+    def from_fragments(self, posts_html: List[str]) -> list:
+        return [
+            lxml_html.fragment_fromstring(post_html)
+            for post_html in posts_html
+        ]
+
+    def from_page(self, page_source: str, block_class: str) -> list:
+        block = lxml_html.document_fromstring(page_source).xpath(
+            f'//div[{has_class(block_class)}]'
+        )[0]
+        return list(block)
+
+    def extract(self, post) -> Optional[dict]:
+        found = {}
+        for element in self._query(post):
+            for class_name in element.get('class').split():
+                tag, field = self._fields.get(class_name, (None, None))
+                if tag == element.tag and field not in found:
+                    found[field] = element
+        if 'url' not in found:  # not a post
+            return None
+        if 'username' not in found:  # deleted user
+            metrics.inc('parser_posts_skipped_total', reason='deleted')
+            return None
+
+        data = {}
+        data['url'] = found['url'].get('href')
+        data['username'] = href_name(found['username'].get('href'))
+        data['post_category'] = self._convert(
+            found, 'post_category', lambda e: href_name(e.get('href'))
+        )
+        for field in ('comments_number', 'votes_number', 'post_date'):
+            data[field] = self._convert(
+                found, field, lambda e: e.text_content()
+            )
+        return data
+
+    @staticmethod
+    def _convert(found: dict, field: str, convert):
+        element = found.get(field)
+        if element is None:  # not a post
+            return None
+        return convert(element)
+
+
+class ProfileExtractor:
+    """
+    Extracts user info from a rendered profile page
+    with karma details popup shown.
+    """
+
+    KARMA_SPAN_ID = 'profile--id-card--highlight-tooltip--karma'
+    CAKEDAY_SPAN_ID = 'profile--id-card--highlight-tooltip--cakeday'
+    KARMA_POPUP_CLASS = '_3uK2I0hi3JFTKnMUFHD2Pd'
+    # interstitial shown instead of 18+ profiles
+    ADULT_GATE_TEXT = 'must be 18+'
+    ADULT_GATE_XPATH = f"//*[contains(text(), '{ADULT_GATE_TEXT}')]"
+
+    def extract(self, page_source: str) -> Optional[UserInfo]:
+        """
+        Returns `UNAVAILABLE` for 18+ pages
+        and None for pages without karma or popup.
+        """
+        soup = BeautifulSoup(page_source, 'html.parser')
+        karma_span = soup.find('span', id=self.KARMA_SPAN_ID)
+        if karma_span is None:
+            if soup.find(string=lambda text: self.ADULT_GATE_TEXT in text):
+                return UNAVAILABLE
+            return None
+        karma_popup = soup.find(class_=self.KARMA_POPUP_CLASS)
+        if karma_popup is None:
+            return None
+        cakeday_span = soup.find('span', id=self.CAKEDAY_SPAN_ID)
+        post_karma, comment_karma = parse_karma_popup(karma_popup.text)
+        return (
+            parse_karma(karma_span.text),
+            parse_cakeday(cakeday_span.text),
+            post_karma,
+            comment_karma,
+        )
+
+
+def get_extractor(engine: str = 'lxml') -> PostExtractor:
+    """
+    Returns extractor for `engine` falling back
+    to `html.parser` if lxml is not installed.
+    """
+    if engine == 'lxml' and etree is not None:
+        return LxmlExtractor()
+    if engine in ('lxml', 'html.parser'):
+        return SoupExtractor()
+    raise ValueError(f'Unknown extractor engine: {engine}')
+
+
+def has_class(class_name: str) -> str:
+    return (
+        "contains(concat(' ', normalize-space(@class), ' '), "
+        f"' {class_name} ')"
+    )
+
+
+def href_name(href: str) -> str:
+    return href.split('/')[-2]
+
+
+def parse_karma(text: str) -> int:
+    return int(text.replace(',', ''))
+
+
+def parse_cakeday(text: str) -> str:
+    return datetime.datetime.strptime(
+        text, '%B %d, %Y'  # CAREFULLY
+    ).strftime('%d-%m-%y')
+
+
+def parse_karma_popup(text: str) -> Tuple[int, int]:
+    """
+    Returns post and comment karma.
+    """
+    post_karma_str, comment_karma_str = text.split('\n')[:2]
+    post_karma = int(post_karma_str.split()[0].replace(',', ''))
+    comment_karma = int(comment_karma_str.split()[0].replace(',', ''))
+    return post_karma, comment_karma
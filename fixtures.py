@@ -0,0 +1,78 @@
+import glob
+import json
+import os
+import threading
+from typing import Iterator, List, Optional
+from urllib.parse import quote
+
+from backends import FetchBackend
+from cache import UserInfo
+from extractors import PostExtractor, ProfileExtractor, get_extractor
+from stub_server import fixture_name
+
+
+class Capture:
+    """
+    Saves fetched pages to `directory`:
+    feed batches as `feed-NNNNN.json` lists of post HTML,
+    rendered profiles as `user-<name>.html`
+    and HTTP responses under `stub_server.fixture_name`.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._feed_batches = 0
+        self._lock = threading.Lock()
+
+    def save_feed(self, posts_html: List[str]):
+        with self._lock:
+            self._feed_batches += 1
+            number = self._feed_batches
+        self._write(f'feed-{number:05d}.json', json.dumps(posts_html))
+
+    def save_profile(self, username: str, page_source: str):
+        self._write(profile_name(username), page_source)
+
+    def save_response(self, path: str, body: bytes):
+        self._write(fixture_name(path), body.decode())
+
+    def _write(self, name: str, content: str):
+        with open(os.path.join(self.directory, name), 'w') as f:
+            f.write(content)
+
+
+class ReplayBackend(FetchBackend):
+    """
+    Serves pages saved by Capture without network and browser,
+    posts and profiles go through the same extractors
+    as in SeleniumBackend.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        extractor: Optional[PostExtractor] = None,
+        profile_extractor: Optional[ProfileExtractor] = None,
+    ):
+        self.directory = directory
+        self.extractor = extractor or get_extractor()
+        self.profile_extractor = profile_extractor or ProfileExtractor()
+
+    def iter_feed(self, incremental: bool = True) -> Iterator[List[dict]]:
+        pattern = os.path.join(self.directory, 'feed-*.json')
+        for filename in sorted(glob.glob(pattern)):
+            with open(filename) as f:
+                posts = self.extractor.from_fragments(json.load(f))
+            yield [self.extractor.extract(post) for post in posts]
+
+    def get_user_info(self, username: str) -> Optional[UserInfo]:
+        filename = os.path.join(self.directory, profile_name(username))
+        if not os.path.exists(filename):  # stuck page, not captured
+            return None
+        with open(filename) as f:
+            return self.profile_extractor.extract(f.read())
+
+
+def profile_name(username: str) -> str:
+    return f"user-{quote(username, safe='')}.html"
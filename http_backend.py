@@ -0,0 +1,141 @@
+import datetime
+from typing import Iterator, List, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from backends import FetchBackend
+from cache import UNAVAILABLE, UserInfo
+from fixtures import Capture
+import metrics
+
+
+class HttpBackend(FetchBackend):
+    """
+    Fetches the feed and user profiles from reddit JSON endpoints
+    with a pooled keep-alive HTTP session, no browser is needed.
+    Profiles are requested from the same host as the feed,
+    so `link` may point to a local stub server.
+    """
+
+    USER_AGENT = 'RedditParser/1.0'
+    PAGE_LIMIT = 100
+    DATE_FORMAT = '%d-%m-%y'
+
+    def __init__(
+        self,
+        link: str,
+        num_workers: int = 1,
+        timeout: float = 10.0,
+        retries: int = 3,
+        capture: Optional[Capture] = None,
+    ):
+        """
+        If `capture` is given, responses are saved to it,
+        so `stub_server.py` can replay them.
+        """
+        self.link = link
+        self.timeout = timeout
+        self.capture = capture
+        scheme, netloc, path, query, _ = urlsplit(link)
+        self.base_url = f'{scheme}://{netloc}'
+        self._feed_path = path.rstrip('/') + '.json'
+        self._feed_query = dict(parse_qsl(query))
+
+        self.session = requests.Session()
+        self.session.headers['User-Agent'] = self.USER_AGENT
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=num_workers + 1,
+            max_retries=Retry(
+                total=retries,
+                backoff_factor=0.5,
+                status_forcelist=[429, 500, 502, 503, 504],
+            ),
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def close(self):
+        self.session.close()
+
+    def iter_feed(self, incremental: bool = True) -> Iterator[List[dict]]:
+        after = None
+        while True:
+            query = dict(
+                self._feed_query, limit=self.PAGE_LIMIT, raw_json=1
+            )
+            if after is not None:
+                query['after'] = after
+            listing = self._get_json(self._feed_path, query)
+            if listing is None:
+                return
+            yield [
+                self._get_post_data(child['data'])
+                for child in listing['data']['children']
+            ]
+            after = listing['data'].get('after')
+            if after is None:
+                return
+
+    def get_user_info(self, username: str) -> Optional[UserInfo]:
+        try:
+            # 403 also means a blocked client, so it is not cached
+            about = self._get_json(
+                f'/user/{username}/about.json', missing=(404,)
+            )
+        except requests.RequestException:  # blocked, throttled or down
+            return None
+        if about is None:  # deleted or banned user
+            return UNAVAILABLE
+        user = about['data']
+        over_18 = (user.get('subreddit') or {}).get('over_18')
+        if user.get('is_suspended') or over_18:
+            return UNAVAILABLE
+        return (
+            user['total_karma'],
+            self._format_date(user['created_utc']),
+            user['link_karma'],
+            user['comment_karma'],
+        )
+
+    def _get_post_data(self, post: dict) -> Optional[dict]:
+        if post.get('author') in (None, '[deleted]'):  # deleted user
+            metrics.inc('parser_posts_skipped_total', reason='deleted')
+            return None
+        return {
+            'url': post['permalink'],
+            'username': post['author'],
+            'post_category': post['subreddit'],
+            'comments_number': post['num_comments'],
+            'votes_number': post['score'],
+            'post_date': self._format_date(post['created_utc']),
+        }
+
+    @metrics.timed('parser_http_request_seconds')
+    def _get_json(
+        self, path: str, query: dict = None, missing=(403, 404)
+    ) -> Optional[dict]:
+        """
+        Returns None for `missing` statuses, raises on other errors.
+        """
+        query = urlencode(query or {})
+        url = urlunsplit(
+            urlsplit(self.base_url)._replace(path=path, query=query)
+        )
+        response = self.session.get(url, timeout=self.timeout)
+        if response.status_code in missing:
+            return None
+        response.raise_for_status()
+        if self.capture is not None:
+            self.capture.save_response(
+                path + ('?' + query if query else ''), response.content
+            )
+        return response.json()
+
+    def _format_date(self, timestamp: float) -> str:
+        return datetime.datetime.fromtimestamp(timestamp).strftime(
+            self.DATE_FORMAT
+        )
@@ -0,0 +1,125 @@
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+
+@dataclass
+class CrawlState:
+    link: str
+    num_posts: int
+    started: float = field(default_factory=time.time)
+    posts: List[dict] = field(default_factory=list)
+    seen_posts: int = 0
+    done: bool = False
+
+
+class CrawlJournal:
+    """
+    Append-only NDJSON journal of a crawl: completed posts
+    and feed position after every collected batch.
+    Writes are flushed at once but fsynced only every
+    `fsync_every` records or `fsync_interval` seconds.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        fsync_every: int = 20,
+        fsync_interval: float = 1.0,
+    ):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self._file = None
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        # size of complete records found by `load`
+        self._loaded_size = 0
+
+    def resume(self, link: str, num_posts: int) -> CrawlState:
+        """
+        Returns state of an unfinished crawl of `link`
+        and continues its journal, otherwise starts a new one.
+        """
+        state = self.load()
+        if state is None or state.done or state.link != link:
+            state = CrawlState(link, num_posts)
+            self._open('w')
+            self._write({
+                'type': 'start',
+                'link': link,
+                'num_posts': num_posts,
+                'started': state.started,
+            })
+            self.sync()
+        else:
+            # drop a torn last line, so records are not appended to it
+            os.truncate(self.path, self._loaded_size)
+            self._open('a')
+        return state
+
+    def load(self) -> Optional[CrawlState]:
+        if not os.path.exists(self.path):
+            return None
+        state = None
+        self._loaded_size = 0
+        with open(self.path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):  # torn last line
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:  # torn last line
+                    break
+                self._loaded_size += len(line)
+                if record['type'] == 'start':
+                    state = CrawlState(
+                        record['link'], record['num_posts'], record['started']
+                    )
+                elif record['type'] == 'batch':
+                    state.posts.extend(record['posts'])
+                    state.seen_posts = record['seen_posts']
+                elif record['type'] == 'done':
+                    state.done = True
+        return state
+
+    def append(self, posts: List[dict], seen_posts: int):
+        """
+        Records collected posts and position of the first feed entry
+        which is not processed completely.
+        """
+        self._write({
+            'type': 'batch', 'posts': posts, 'seen_posts': seen_posts
+        })
+        self._unsynced += 1
+        if (
+            self._unsynced >= self.fsync_every
+            or time.monotonic() - self._last_sync >= self.fsync_interval
+        ):
+            self.sync()
+
+    def finish(self):
+        self._write({'type': 'done'})
+        self.sync()
+
+    def sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def close(self):
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
+
+    def _open(self, mode: str):
+        self.close()
+        self._file = open(self.path, mode)
+
+    def _write(self, record: dict):
+        self._file.write(json.dumps(record) + '\n')
+        self._file.flush()
@@ -0,0 +1,38 @@
+import argparse
+import time
+
+import psycopg2
+
+import postgres as pg
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(
+        description='Loads parser CSV output to the database '
+                    'configured by REDDITDB_* variables'
+    )
+    arg_parser.add_argument('files', nargs='+')
+    arg_parser.add_argument(
+        '--chunk-rows', type=int, default=pg.LOAD_CHUNK_ROWS
+    )
+    arg_parser.add_argument(
+        '--rebuild-summaries', action='store_true',
+        help='recompute analytics tables from already stored posts'
+    )
+    args = arg_parser.parse_args()
+
+    conn = psycopg2.connect(**pg.db_config())
+    cursor = conn.cursor()
+    pg.create_users(cursor)
+    pg.create_posts(cursor)
+    pg.create_summaries(cursor)
+    if args.rebuild_summaries:
+        pg.rebuild_summaries(cursor)
+    conn.commit()
+    for filename in args.files:
+        start = time.time()
+        rows = pg.load_data(cursor, filename, args.chunk_rows, verbose=True)
+        conn.commit()
+        print(f'{filename}: {rows} rows in {time.time() - start:.3f}s')
+    cursor.close()
+    conn.close()
@@ -0,0 +1,180 @@
+import argparse
+import asyncio
+import json
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+import requests
+
+from bench import git_version
+
+try:
+    import aiohttp
+except ImportError:  # only thread based clients are available
+    aiohttp = None
+
+
+def percentile(latencies: List[float], q: int) -> float:
+    return statistics.quantiles(latencies, n=100)[q - 1]
+
+
+def run(
+    urls: List[str], num_requests: int, concurrency: int
+) -> Dict[str, float]:
+    """
+    Sends `num_requests` GET requests cycling over `urls`
+    from `concurrency` threads, each with its own session.
+    """
+    local = threading.local()
+    sessions = []
+
+    def fetch(i: int) -> float:
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+            sessions.append(local.session)
+        session = local.session
+        start = time.perf_counter()
+        session.get(urls[i % len(urls)]).raise_for_status()
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        latencies = list(pool.map(fetch, range(num_requests)))
+    elapsed = time.perf_counter() - start
+    for session in sessions:
+        session.close()
+    return latency_stats(latencies, elapsed)
+
+
+async def run_async(
+    urls: List[str], num_requests: int, clients: int
+) -> Dict[str, float]:
+    """
+    Same as `run` with `clients` concurrent keep-alive connections
+    of one event loop, which scales past thread limits.
+    """
+    latencies = []
+    requests_left = iter(range(num_requests))
+    connector = aiohttp.TCPConnector(limit=clients)
+    async with aiohttp.ClientSession(connector=connector) as session:
+
+        async def client():
+            for i in requests_left:
+                start = time.perf_counter()
+                async with session.get(urls[i % len(urls)]) as response:
+                    response.raise_for_status()
+                    await response.read()
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(clients)))
+        elapsed = time.perf_counter() - start
+    return latency_stats(latencies, elapsed)
+
+
+def latency_stats(latencies: List[float], elapsed: float) -> Dict[str, float]:
+    return {
+        'p50': percentile(latencies, 50),
+        'p99': percentile(latencies, 99),
+        'rps': len(latencies) / elapsed,
+    }
+
+
+def run_bulk(
+    base_url: str, num_rows: int, batch_size: int
+) -> Dict[str, float]:
+    """
+    Writes `num_rows` synthetic posts to /posts/bulk
+    in NDJSON requests of `batch_size` posts.
+    """
+    lines = [
+        json.dumps({
+            'url': f'https://www.reddit.com/r/loadtest/comments/{i}',
+            'post_date': '2021-03-01',
+            'comments_number': i % 1000,
+            'votes_number': i % 100000,
+            'post_category': f'category_{i % 50}',
+            'username': f'loadtest_user_{i % (num_rows // 10 + 1)}',
+            'user_karma': i,
+            'user_cakeday': '2015-01-01',
+            'post_karma': i,
+            'comment_karma': i,
+        })
+        for i in range(num_rows)
+    ]
+    start = time.perf_counter()
+    with requests.Session() as session:
+        for i in range(0, num_rows, batch_size):
+            session.post(
+                f'{base_url}/posts/bulk',
+                data='\n'.join(lines[i:i + batch_size]),
+                headers={'Content-Type': 'application/x-ndjson'},
+            ).raise_for_status()
+    return {'rows_per_second': num_rows / (time.perf_counter() - start)}
+
+
+def post_urls(base_url: str, limit: int) -> List[str]:
+    """
+    Returns urls of single posts from the first page of the list.
+    """
+    posts = requests.get(f'{base_url}/posts/', params={'limit': limit})
+    posts.raise_for_status()
+    return [f"{base_url}/posts/{post['post_uuid']}" for post in posts.json()]
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(
+        description='Measures latency of a running posts API server'
+    )
+    arg_parser.add_argument('--url', default='http://127.0.0.1:5000')
+    arg_parser.add_argument('--requests', type=int, default=2000)
+    arg_parser.add_argument('--concurrency', type=int, default=16)
+    arg_parser.add_argument(
+        '--async-clients', type=int, default=0,
+        help='use that many asyncio clients instead of threads'
+    )
+    arg_parser.add_argument(
+        '--bulk-rows', type=int, default=0,
+        help='also write that many synthetic posts through /posts/bulk'
+    )
+    arg_parser.add_argument('--bulk-batch', type=int, default=5000)
+    arg_parser.add_argument(
+        '--name', default='server',
+        help='prefix of metric names, e.g. the server variant'
+    )
+    arg_parser.add_argument(
+        '--results', default='bench-results.ndjson',
+        help='file to append results to'
+    )
+    args = arg_parser.parse_args()
+
+    scenarios = {
+        'list': [f'{args.url}/posts/?limit=20'],
+        'by_uuid': post_urls(args.url, 100),
+    }
+    metrics = {}
+    for scenario, urls in scenarios.items():
+        if args.async_clients:
+            stats = asyncio.run(
+                run_async(urls, args.requests, args.async_clients)
+            )
+        else:
+            stats = run(urls, args.requests, args.concurrency)
+        for name, value in stats.items():
+            metrics[f'{args.name}.{scenario}.{name}'] = value
+    if args.bulk_rows:
+        bulk = run_bulk(args.url, args.bulk_rows, args.bulk_batch)
+        for name, value in bulk.items():
+            metrics[f'{args.name}.bulk.{name}'] = value
+    for name, value in metrics.items():
+        print(f'{name}: {value:.6g}')
+    with open(args.results, 'a') as f:
+        f.write(json.dumps({
+            'version': git_version(),
+            'timestamp': time.time(),
+            'params': vars(args),
+            'metrics': metrics,
+        }) + '\n')
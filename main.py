@@ -1,13 +1,108 @@
+import argparse
 import time
 
+from cache import UserInfoCache
+from dedupe import SeenIndex
+from fixtures import Capture, ReplayBackend
+from http_backend import HttpBackend
+from journal import CrawlJournal
+import metrics
 from parser import RedditParser
+from writers import WRITERS, get_writer
 
 
 if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Parses reddit posts')
+    arg_parser.add_argument(
+        '--link', default='https://www.reddit.com/top/?t=month'
+    )
+    arg_parser.add_argument('--posts', type=int, default=100)
+    arg_parser.add_argument('--workers', type=int, default=4)
+    arg_parser.add_argument(
+        '--backend', choices=['selenium', 'http'], default='selenium',
+        help='fetch pages with headless Firefox or plain HTTP'
+    )
+    arg_parser.add_argument(
+        '--capture', metavar='DIR',
+        help='save fetched pages to DIR for offline replay'
+    )
+    arg_parser.add_argument(
+        '--replay', metavar='DIR',
+        help='parse pages saved to DIR instead of fetching them'
+    )
+    arg_parser.add_argument(
+        '--memory-bounded', action='store_true',
+        help='empty processed posts in the browser page'
+    )
+    arg_parser.add_argument(
+        '--stream', action='store_true',
+        help='write posts in batches while parsing'
+    )
+    arg_parser.add_argument(
+        '--format', choices=sorted(WRITERS), default='csv',
+        help='output format in streaming mode'
+    )
+    arg_parser.add_argument(
+        '--journal', metavar='FILE',
+        help='record progress to FILE and resume an interrupted crawl'
+    )
+    arg_parser.add_argument(
+        '--seen', metavar='FILE',
+        help='skip posts listed in FILE and add written posts to it'
+    )
+    arg_parser.add_argument(
+        '--seen-csv', metavar='FILE', action='append', default=[],
+        help='also skip posts of a previous CSV output, can be repeated'
+    )
+    arg_parser.add_argument(
+        '--metrics', action='store_true',
+        help='print timings of parser stages at the end'
+    )
+    args = arg_parser.parse_args()
+    metrics.enable(args.metrics or metrics.enabled)
 
-    output_file = f"reddit-{time.strftime('%Y%m%d%H%M')}.csv"  # noqa: E228
+    output_file = f"reddit-{time.strftime('%Y%m%d%H%M')}"  # noqa: E228
+    output_file += f'.{args.format}' if args.stream else '.csv'
     start = time.time()
-    parser = RedditParser('https://www.reddit.com/top/?t=month')
-    posts = parser.get_posts_data(100, verbose=True)
+    capture = Capture(args.capture) if args.capture else None
+    if args.replay:
+        backend = ReplayBackend(args.replay)
+    elif args.backend == 'http':
+        backend = HttpBackend(args.link, args.workers, capture=capture)
+    else:
+        from selenium_backend import SeleniumBackend
+        backend = SeleniumBackend(
+            args.link, args.workers,
+            capture=capture, memory_bounded=args.memory_bounded
+        )
+    seen_index = SeenIndex(args.seen)
+    for filename in args.seen_csv:
+        seen_index.load_csv(filename)
+
+    def mark_seen(posts):
+        # posts are marked as seen only once they are in the output,
+        # so a failed run does not hide them from the next one
+        seen_index.update(post['url'] for post in posts)
+        seen_index.flush()
+
+    with RedditParser(
+        args.link,
+        num_workers=args.workers,
+        user_cache=UserInfoCache('users-cache.sqlite3'),
+        seen_index=seen_index,
+        backend=backend,
+        journal=CrawlJournal(args.journal) if args.journal else None,
+    ) as parser:
+        if args.stream:
+            with get_writer(
+                args.format, output_file, RedditParser.DATA_ORDER,
+                on_flush=mark_seen,
+            ) as writer:
+                for post in parser.iter_posts(args.posts, verbose=True):
+                    writer.write(post)
+        else:
+            posts = parser.get_posts_data(args.posts, verbose=True)
+            posts.to_csv(output_file, sep=';', index=False)
+            mark_seen(posts.to_dict('records'))
+    seen_index.close()
     print(f'Elapsed time: {time.time() - start:.3f}s')
-    posts.to_csv(output_file, sep=';', index=False)
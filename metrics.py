@@ -0,0 +1,194 @@
+import bisect
+import functools
+import os
+import threading
+import time
+from contextlib import nullcontext
+from typing import Callable, Dict, List, Tuple
+
+# upper bounds of histogram buckets in seconds
+BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.max = max(self.max, value)
+
+
+class Registry:
+    """
+    Thread-safe counters and latency histograms with labels,
+    rendered in Prometheus text format.
+    """
+
+    def __init__(self):
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            if key not in series:
+                series[key] = Histogram()
+            series[key].observe(value)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines.append(f'# TYPE {name} counter')
+                for labels, value in series.items():
+                    lines.append(f'{name}{format_labels(labels)} {value:g}')
+            for name, series in sorted(self._histograms.items()):
+                lines.append(f'# TYPE {name} histogram')
+                for labels, histogram in series.items():
+                    cumulative = 0
+                    bounds = [f'{b:g}' for b in histogram.buckets] + ['+Inf']
+                    for bound, count in zip(bounds, histogram.counts):
+                        cumulative += count
+                        bucket_labels = format_labels(
+                            labels + (('le', bound),)
+                        )
+                        lines.append(
+                            f'{name}_bucket{bucket_labels} {cumulative}'
+                        )
+                    lines.append(
+                        f'{name}_sum{format_labels(labels)} '
+                        f'{histogram.sum:g}'
+                    )
+                    lines.append(
+                        f'{name}_count{format_labels(labels)} '
+                        f'{histogram.count}'
+                    )
+        return '\n'.join(lines) + '\n'
+
+    def summary(self) -> dict:
+        """
+        Counter values and count/total/mean/max of histograms
+        keyed by series name with labels.
+        """
+        summary = {}
+        with self._lock:
+            for name, series in self._counters.items():
+                for labels, value in series.items():
+                    summary[name + format_labels(labels)] = value
+            for name, series in self._histograms.items():
+                for labels, histogram in series.items():
+                    summary[name + format_labels(labels)] = {
+                        'count': histogram.count,
+                        'total': histogram.sum,
+                        'mean': histogram.sum / histogram.count,
+                        'max': histogram.max,
+                    }
+        return summary
+
+
+class Timer:
+    def __init__(self, name: str, labels: dict):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        registry.observe(
+            self.name, time.perf_counter() - self.start, **self.labels
+        )
+
+
+registry = Registry()
+# off unless REDDIT_METRICS=1, for the parser and both servers,
+# instrumentation costs one flag check while disabled
+enabled = os.environ.get('REDDIT_METRICS', '0') not in ('', '0')
+_noop = nullcontext()
+
+
+def enable(on: bool = True):
+    global enabled
+    enabled = on
+
+
+def inc(name: str, value: float = 1, **labels):
+    if enabled:
+        registry.inc(name, value, **labels)
+
+
+def observe(name: str, value: float, **labels):
+    if enabled:
+        registry.observe(name, value, **labels)
+
+
+def timer(name: str, **labels):
+    """
+    Context manager observing its duration in histogram `name`.
+    """
+    if not enabled:
+        return _noop
+    return Timer(name, labels)
+
+
+def timed(name: str, **labels) -> Callable:
+    """
+    Decorator observing call durations in histogram `name`.
+    """
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return func(*args, **kwargs)
+            with Timer(name, labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def format_labels(labels: Labels) -> str:
+    if not labels:
+        return ''
+    pairs = ','.join(f'{k}="{v}"' for k, v in labels)
+    return '{' + pairs + '}'
+
+
+def format_summary(summary: dict) -> List[str]:
+    lines = []
+    for name, value in sorted(summary.items()):
+        if isinstance(value, dict):
+            lines.append(
+                f"{name}: {value['count']} calls, "
+                f"{value['total']:.3f}s total, "
+                f"{value['mean'] * 1000:.1f}ms mean, "
+                f"{value['max'] * 1000:.1f}ms max"
+            )
+        else:
+            lines.append(f'{name}: {value:g}')
+    return lines
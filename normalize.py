@@ -0,0 +1,98 @@
+import datetime
+from typing import List, Optional
+
+import pandas as pd
+
+
+COUNT_COLUMNS = ['comments_number', 'votes_number']
+DATE_COLUMNS = ['post_date']
+DATE_FORMAT = '%d-%m-%y'
+
+# '6.7k comments', '1.5k', '208', '1,024'
+COUNT_PATTERN = r'^\s*(?P<number>\d[\d,]*(?:\.\d+)?)\s*(?P<suffix>[kKmM]?)'
+COUNT_SUFFIXES = {'': 1, 'k': 1e3, 'K': 1e3, 'm': 1e6, 'M': 1e6}
+
+# '3 hours ago', '1 day ago', 'just now'
+DATE_PATTERN = r'^\s*(?P<count>\d+)\s+(?P<unit>[a-z]+?)s?\s+ago'
+DATE_UNITS = {
+    'second': 1,
+    'minute': 60,
+    'hour': 60 * 60,
+    'day': 24 * 60 * 60,
+    'week': 7 * 24 * 60 * 60,
+    'month': 30 * 24 * 60 * 60,
+    'year': 365 * 24 * 60 * 60,
+}
+
+
+def parse_counts(values: pd.Series) -> pd.Series:
+    """
+    Converts counts like `6.7k comments` to integers.
+    Numbers are kept as is, unparsable values become NA.
+    """
+    numeric = pd.to_numeric(values, errors='coerce')
+    raw = values[numeric.isna() & values.notna()].astype(str)
+    if not raw.empty:
+        parts = raw.str.extract(COUNT_PATTERN)
+        number = pd.to_numeric(
+            parts['number'].str.replace(',', '', regex=False),
+            errors='coerce'
+        )
+        numeric[raw.index] = number * parts['suffix'].map(COUNT_SUFFIXES)
+    return numeric.round().astype('Int64')
+
+
+def parse_relative_dates(
+    values: pd.Series, now: Optional[datetime.datetime] = None
+) -> pd.Series:
+    """
+    Converts dates like `3 hours ago` to `%d-%m-%y` strings
+    relative to `now`. Already formatted dates are kept.
+    """
+    now = pd.Timestamp(now or datetime.datetime.now())
+    lowered = values.astype('string').str.lower()
+    parts = lowered.str.extract(DATE_PATTERN)
+    relative = parts['count'].notna()
+    # 'just now' and the like
+    recent = lowered.str.contains('now', na=False) & ~relative
+    if not relative.any() and not recent.any():
+        return values
+    seconds = (
+        pd.to_numeric(parts.loc[relative, 'count'])
+        * parts.loc[relative, 'unit'].map(DATE_UNITS)
+    )
+    known = seconds.notna()
+    dates = now - pd.to_timedelta(seconds[known], unit='s')
+    result = values.astype(object).copy()
+    result[dates.index] = dates.dt.strftime(DATE_FORMAT)
+    result[recent] = now.strftime(DATE_FORMAT)
+    return result
+
+
+def normalize_frame(
+    frame: pd.DataFrame, now: Optional[datetime.datetime] = None
+) -> pd.DataFrame:
+    """
+    Normalizes raw post fields of the whole frame in place
+    using a single reference time.
+    """
+    for column in COUNT_COLUMNS:
+        if column in frame:
+            frame[column] = parse_counts(frame[column])
+    for column in DATE_COLUMNS:
+        if column in frame:
+            frame[column] = parse_relative_dates(frame[column], now)
+    return frame
+
+
+def normalize_records(
+    posts: List[dict], now: Optional[datetime.datetime] = None
+) -> List[dict]:
+    """
+    Same as `normalize_frame` for a batch of post dicts,
+    values are converted back to plain Python objects.
+    """
+    if not posts:
+        return posts
+    frame = normalize_frame(pd.DataFrame(posts), now).astype(object)
+    return frame.where(frame.notna(), None).to_dict('records')
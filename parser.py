@@ -1,16 +1,21 @@
 import datetime
-import time
-from typing import Optional, List, Tuple
-
-from bs4 import BeautifulSoup
-from bs4.element import Tag
-from selenium import webdriver
-from selenium.common.exceptions import NoSuchElementException
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.common.action_chains import ActionChains
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import chain
+from typing import Deque, Dict, Iterator, Optional, List, Set, Tuple
+
 from uuid import uuid1
 import pandas as pd
 
+from backends import FetchBackend
+from cache import UserInfo, UserInfoCache
+from dedupe import SeenIndex
+from extractors import PostExtractor
+from journal import CrawlJournal, CrawlState
+import metrics
+from normalize import normalize_frame, normalize_records
+from waits import PageWaiter
+
 
 class RedditParser:
     """
@@ -18,17 +23,6 @@ class RedditParser:
     and compiles all data to pandas DataFrame.
     """
 
-    POSTS_BLOCK_CLASS = 'rpBJOHq2PR60pnwJlUyP0'
-    POST_URL_CLASS = 'SQnoC3ObvgnGjWt90zD9Z'
-    USER_URL_CLASS = '_2tbHP6ZydRpjI44J3syuqC'
-    POST_CATEGORY_CLASS = '_3ryJoIoycVkA88fy40qNJc'
-    COMMENT_NUMBER_CLASS = 'FHCV02u6Cp2zYL0fhQPsO'
-    VOTES_NUMBER_CLASS = '_1rZYMD_4xY3gRcSS3p8ODO'
-    POST_DATE_CLASS = '_3jOxDPIQ0KaOWpzvSQo-1s'
-    USER_BASE_LINK = 'https://www.reddit.com/user/'
-    KARMA_SPAN_ID = 'profile--id-card--highlight-tooltip--karma'
-    CAKEDAY_SPAN_ID = 'profile--id-card--highlight-tooltip--cakeday'
-    KARMA_POPUP_CLASS = '_3uK2I0hi3JFTKnMUFHD2Pd'
     DATA_ORDER = [
         'post_uuid',
         'url',
@@ -43,183 +37,266 @@ class RedditParser:
         'post_category',
     ]
 
-    def __init__(self, link: str):
+    def __init__(
+        self,
+        link: str,
+        num_workers: int = 1,
+        user_cache: Optional[UserInfoCache] = None,
+        waiter: Optional[PageWaiter] = None,
+        extractor: Optional[PostExtractor] = None,
+        seen_index: Optional[SeenIndex] = None,
+        backend: Optional[FetchBackend] = None,
+        journal: Optional[CrawlJournal] = None,
+    ):
+        """
+        Fetches the feed and user profiles through `backend`,
+        by default headless Firefox with `num_workers` extra drivers
+        used to fetch user profiles.
+        Profiles found in `user_cache` are not fetched again
+        and a profile being fetched is shared by all posts of its user,
+        posts found in `seen_index` are skipped, the caller marks
+        posts as seen once they are written.
+        Progress is recorded to `journal` and an interrupted crawl
+        of the same link continues from the last checkpoint.
+        """
+        self._profile_pool = None
+        if num_workers < 1:
+            raise ValueError('num_workers must be positive')
         self.link = link
+        self.user_cache = user_cache or UserInfoCache()
+        self.seen_index = seen_index if seen_index is not None else SeenIndex()
+        self.journal = journal
+        # profile fetches in progress by username
+        self._fetching: Dict[str, Future] = {}
+        # posts which reused a fetch in progress, reported as cache hits
+        self.shared_fetches = 0
+        if backend is None:
+            from selenium_backend import SeleniumBackend
+            backend = SeleniumBackend(link, num_workers, waiter, extractor)
+        self.backend = backend
+        self._profile_pool = ThreadPoolExecutor(max_workers=num_workers)
+
+    def __enter__(self):
+        return self
 
-        options = webdriver.FirefoxOptions()
-        options.add_argument('--headless')
-        self.driver = webdriver.Firefox(options=options)
-        self.driver.get(self.link)
-        self.driver.execute_script('return document.documentElement.outerHTML')
+    def __exit__(self, *exc_info):
+        self.close()
 
     def __del__(self):
-        self.driver.quit()
+        self.close()
+
+    def close(self):
+        if self._profile_pool is None:
+            return
+        self._profile_pool.shutdown(wait=True, cancel_futures=True)
+        self._profile_pool = None
+        self.backend.close()
+        if self.journal is not None:
+            self.journal.close()
 
     def get_posts_data(
-        self, num_posts: int, verbose: bool = False
+        self, num_posts: int, verbose: bool = False, incremental: bool = True
     ) -> pd.DataFrame:
         """
         Parses scecified ammount of posts.
         Skips posts of deleted users and 18+ users.
         """
-        posts = []
+        state = self._start(num_posts)
+        now = datetime.datetime.fromtimestamp(state.started)
+        posts = pd.DataFrame(
+            chain.from_iterable(
+                self._iter_batches(num_posts, verbose, incremental, state)
+            ),
+            columns=self.DATA_ORDER,
+        )
+        return normalize_frame(posts, now)
+
+    def iter_posts(
+        self, num_posts: int, verbose: bool = False, incremental: bool = True
+    ) -> Iterator[dict]:
+        """
+        Yields up to `num_posts` parsed posts in feed order.
+        Posts are normalized in batches as they are collected,
+        dates are relative to the start of the crawl.
+        """
+        state = self._start(num_posts)
+        now = datetime.datetime.fromtimestamp(state.started)
+        batches = self._iter_batches(num_posts, verbose, incremental, state)
+        for batch in batches:
+            yield from normalize_records(batch, now)
+
+    def _start(self, num_posts: int) -> CrawlState:
+        if self.journal is None:
+            return CrawlState(self.link, num_posts)
+        return self.journal.resume(self.link, num_posts)
+
+    def _iter_batches(
+        self,
+        num_posts: int,
+        verbose: bool,
+        incremental: bool,
+        state: CrawlState,
+    ) -> Iterator[List[dict]]:
+        """
+        Yields batches of posts with raw counts and dates.
+        User profiles are fetched by the worker pool
+        while the backend keeps fetching the feed.
+        In incremental mode only new posts are pulled from the page
+        after each scroll instead of the whole page source.
+        Posts restored from the journal come first, feed entries
+        before the checkpoint are skipped without processing.
+        """
+        restored = state.posts[:num_posts]
+        parsed = len(restored)
+        if restored:
+            yield restored
+        pending = deque()
         seen_posts = 0
-        seen_urls = []
-
-        while True:
-            soup = BeautifulSoup(self.driver.page_source, 'html.parser')
-            current_seen_posts = soup.find(
-                'div', class_=self.POSTS_BLOCK_CLASS
-            ).contents[seen_posts:]
-            for post in current_seen_posts:
+        seen_urls = {post['url'] for post in restored}
+        feed = self.backend.iter_feed(incremental)
+        current_seen_posts = deque()
+
+        while parsed < num_posts:
+            # fetch more posts only when the current batch is processed
+            exhausted = False
+            if not current_seen_posts:
+                batch = next(feed, None)
+                exhausted = batch is None
+                current_seen_posts.extend(batch or [])
+            while current_seen_posts:
                 seen_posts += 1
-                post_data = self._get_post_data(post, seen_urls)
+                if seen_posts <= state.seen_posts:
+                    current_seen_posts.popleft()
+                    continue
+                post_data = self._get_post_data(
+                    current_seen_posts.popleft(), seen_urls
+                )
                 if post_data is None:
                     continue
 
-                seen_urls.append(post_data['url'])
-                posts.append(post_data)
-
+                seen_urls.add(post_data['url'])
+                future = self._get_user_info(post_data['username'])
+                pending.append((post_data, future, seen_posts - 1))
+                if parsed + len(pending) >= num_posts:
+                    break
+            # wait for the pool only when enough posts are queued
+            # or the feed is exhausted,
+            # otherwise just take what is already done
+            wait = exhausted or parsed + len(pending) >= num_posts
+            posts = self._collect_posts(pending, num_posts - parsed, wait)
+            for _ in posts:
+                parsed += 1
                 if verbose:
                     print(
-                        f'Parsed posts: {len(posts)} of {num_posts}',
+                        f'Parsed posts: {parsed} of {num_posts}',
                         f'(Seen: {seen_posts})'
                     )
-                if len(posts) >= num_posts:
-                    break
-            if len(posts) >= num_posts:
+            if posts and self.journal is not None:
+                # entries from the first pending one on are processed again
+                # after a restart
+                checkpoint = pending[0][2] if pending else seen_posts
+                self.journal.append(posts, checkpoint)
+            if posts:
+                yield posts
+            if parsed >= num_posts or exhausted:
+                for _, future, _ in pending:
+                    future.cancel()
+                break
+
+        if verbose:
+            stats = self.user_cache.stats()
+            hits = stats['hits'] + self.shared_fetches
+            total = hits + stats['misses']
+            print(
+                f'User cache: {hits} hits',
+                f'({self.shared_fetches} of fetches in progress),',
+                f"{stats['misses']} misses",
+                f'({hits / total if total else 0.0:.1%})'
+            )
+            print(*self.backend.stats(), sep='\n')
+            if metrics.enabled:
+                summary = metrics.registry.summary()
+                print(*metrics.format_summary(summary), sep='\n')
+        if self.journal is not None:
+            self.journal.finish()
+
+    def _collect_posts(
+        self,
+        pending: Deque[Tuple[dict, Future, int]],
+        limit: int,
+        wait: bool,
+    ) -> List[dict]:
+        """
+        Takes up to `limit` enriched posts from `pending` keeping feed order.
+        """
+        posts = []
+        while pending and len(posts) < limit:
+            post_data, future, _ = pending[0]
+            if not wait and not future.done():
                 break
-            # scroll to the end of page to load more posts
-            self.driver.find_element_by_tag_name('body').send_keys(Keys.END)
-        return pd.DataFrame(posts)[self.DATA_ORDER]
+            pending.popleft()
+            try:
+                user_data = future.result()
+            except Exception as e:
+                # a failed profile costs only the posts of its user
+                print(
+                    f"Failed to fetch profile of {post_data['username']}:",
+                    repr(e)
+                )
+                metrics.inc('parser_posts_skipped_total', reason='error')
+                continue
+            if not user_data:
+                # 18+ or not loaded page
+                metrics.inc('parser_posts_skipped_total', reason='profile')
+                continue
+            post_data['post_uuid'] = uuid1().hex
+            post_data['user_karma'] = user_data[0]
+            post_data['user_cakeday'] = user_data[1]
+            post_data['post_karma'] = user_data[2]
+            post_data['comment_karma'] = user_data[3]
+            posts.append(post_data)
+        metrics.inc('parser_posts_total', len(posts))
+        return posts
 
     def _get_post_data(
-        self, post: Tag, seen_urls: List[str]
+        self, data: Optional[dict], seen_urls: Set[str]
     ) -> Optional[dict]:
-        data = {}
-        data['url'] = self._get_post_url(post)
-        if data['url'] is None or data['url'] in seen_urls:
-            # not a post or seen post
-            return None
-        data['username'] = self._get_post_username(post)
-        if data['username'] is None:
-            # deleted user
+        if data is None:  # not a post or deleted user
             return None
-        user_data = self._get_user_info(data['username'])
-        if user_data is None:
-            # 18+ page
+        if data['url'] in seen_urls or data['url'] in self.seen_index:
+            # seen in this or previous crawls
+            metrics.inc('parser_posts_skipped_total', reason='seen')
             return None
-        data['post_uuid'] = uuid1().hex
-        data['user_karma'] = user_data[0]
-        data['user_cakeday'] = user_data[1]
-        data['post_karma'] = user_data[2]
-        data['comment_karma'] = user_data[3]
-        data['post_category'] = self._get_post_category(post)
-        data['comments_number'] = self._get_comments_number(post)
-        data['votes_number'] = self._get_votes_number(post)
-        data['post_date'] = self._get_post_date(post)
         return data
 
-    def _get_post_url(self, post: Tag) -> Optional[str]:
-        post_url_a = post.find('a', class_=self.POST_URL_CLASS)
-        if post_url_a is None:  # not a post
-            return None
-        return post_url_a.get('href')
-
-    def _get_post_username(self, post: Tag) -> Optional[str]:
-        user_url_a = post.find('a', class_=self.USER_URL_CLASS)
-        if user_url_a is None:  # not a post
-            return None
-        return user_url_a.get('href').split('/')[-2]
-
-    def _get_post_category(self, post: Tag) -> Optional[str]:
-        post_category_a = post.find('a', class_=self.POST_CATEGORY_CLASS)
-        if post_category_a is None:  # not a post
-            return None
-        return post_category_a.get('href').split('/')[-2]
-
-    def _get_comments_number(self, post: Tag) -> Optional[int]:
-        comment_number_div = post.find(
-            'span', class_=self.COMMENT_NUMBER_CLASS
+    def _get_user_info(self, username: str) -> Future:
+        """
+        Returns future of the user profile from the cache,
+        a fetch in progress or a new fetch in the worker pool.
+        """
+        future = self._fetching.get(username)
+        if future is not None:
+            self.shared_fetches += 1
+            return future
+        user_data = self.user_cache.get(username)
+        if user_data is not None:
+            future = Future()
+            future.set_result(user_data)
+            return future
+        future = self._profile_pool.submit(self._fetch_user_info, username)
+        self._fetching[username] = future
+        # the profile is in the cache by the time the fetch is done
+        future.add_done_callback(
+            lambda _: self._fetching.pop(username, None)
         )
-        if comment_number_div is None:  # not a post
-            return None
-        comment_number_raw = comment_number_div.text.split()[0]
-        if 'k' in comment_number_raw:  # comments specified in thousands
-            return int(float(comment_number_raw[:-1]) * 1000)
-        return int(comment_number_raw)
-
-    def _get_votes_number(self, post: Tag) -> Optional[int]:
-        votes_number_div = post.find('div', class_=self.VOTES_NUMBER_CLASS)
-        if votes_number_div is None:  # not a post
-            return None
-        if 'k' in votes_number_div.text:  # votes specified in thousands
-            return int(votes_number_div.text[:-1]) * 1000
-        return int(votes_number_div.text)
+        return future
 
-    def _get_post_date(self, post: Tag) -> Optional[str]:
-        post_date_a = post.find('a', class_=self.POST_DATE_CLASS)
-        if post_date_a is None:  # not a post
-            return None
-        count, units = post_date_a.text.split()[:2]
-        count = int(count)
-        now = datetime.datetime.now()
-        if units == 'hours':
-            post_date = now - datetime.timedelta(hours=count)
-        else:
-            post_date = now - datetime.timedelta(days=count)
-        return post_date.strftime('%d-%m-%y')
-
-    def _get_user_info(
-        self, username: str
-    ) -> Optional[Tuple[int, str, int, int]]:
-        link = self.USER_BASE_LINK + username
-
-        # open tab
-        self.driver.execute_script("window.open('');")
-        self.driver.switch_to.window(self.driver.window_handles[1])
-
-        # load a page
-        self.driver.get(link)
-        self.driver.execute_script('return document.documentElement.outerHTML')
-        time.sleep(2)
-
-        # hover mouse to karma to show karma details
-        try:
-            karma_span = self.driver.find_element_by_id(self.KARMA_SPAN_ID)
-        except NoSuchElementException:  # 18+ page
-            self.driver.close()
-            self.driver.switch_to.window(self.driver.window_handles[0])
-            return None
-        hover = ActionChains(self.driver).move_to_element(karma_span)
-        hover.perform()
-        soup = BeautifulSoup(self.driver.page_source, 'html.parser')
-
-        # get user karma
-        user_karma = int(soup.find(
-            'span', id=self.KARMA_SPAN_ID
-        ).text.replace(',', ''))
-
-        # get user cakeday
-        user_cakeday_string = soup.find('span', id=self.CAKEDAY_SPAN_ID).text
-        user_cakeday = datetime.datetime.strptime(
-            user_cakeday_string, '%B %d, %Y'  # CAREFULLY
-        ).strftime('%d-%m-%y')
-
-        # wait until karma details popup appears
-        while True:
-            karma_popup = soup.find(class_=self.KARMA_POPUP_CLASS)
-            if karma_popup is not None:
-                break
-            time.sleep(1)
-            soup = BeautifulSoup(self.driver.page_source, 'html.parser')
-
-        # get post and comment karma
-        post_karma_str, comment_karma_str = karma_popup.text.split('\n')[:2]
-        post_karma = int(post_karma_str.split()[0].replace(',', ''))
-        comment_karma = int(comment_karma_str.split()[0].replace(',', ''))
-
-        # close the tab
-        self.driver.close()
-        self.driver.switch_to.window(self.driver.window_handles[0])
-        return user_karma, user_cakeday, post_karma, comment_karma
+    @metrics.timed('parser_profile_fetch_seconds')
+    def _fetch_user_info(self, username: str) -> Optional[UserInfo]:
+        """
+        Runs in the worker pool.
+        """
+        user_data = self.backend.get_user_info(username)
+        if user_data is not None:
+            self.user_cache.set(username, user_data)
+        return user_data
@@ -1,7 +1,20 @@
+import datetime
+import io
+import os
+import threading
+import time
+from itertools import islice
+from typing import Iterator, List, Optional, Tuple
+
 import psycopg2 as pg
 from psycopg2 import sql
+from psycopg2.extensions import connection
+from psycopg2.extras import execute_values
+from psycopg2.pool import PoolError, ThreadedConnectionPool
 import uuid
 
+import metrics
+
 
 def create_users(cursor):
     cursor.execute('''
@@ -13,6 +26,11 @@ def create_users(cursor):
             post_karma integer,
             comment_karma integer
         );
+        CREATE UNIQUE INDEX IF NOT EXISTS users_name_key ON users (name);
+        -- substring search on names
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+        CREATE INDEX IF NOT EXISTS users_name_trgm_idx
+            ON users USING gin (name gin_trgm_ops);
     ''')
 
 
@@ -31,202 +49,696 @@ def create_posts(cursor):
             FOREIGN KEY (user_id)
                 REFERENCES users (id)
         );
+        -- keyset pagination, newest first and posts without date last,
+        -- see POSTS_DATE_KEY
+        CREATE INDEX IF NOT EXISTS posts_date_key_uuid_idx
+            ON posts ((coalesce(post_date, '-infinity')) DESC, uuid DESC);
+        CREATE INDEX IF NOT EXISTS posts_category_date_key_uuid_idx
+            ON posts (
+                category, (coalesce(post_date, '-infinity')) DESC, uuid DESC
+            );
+        CREATE INDEX IF NOT EXISTS posts_user_date_key_uuid_idx
+            ON posts (
+                user_id, (coalesce(post_date, '-infinity')) DESC, uuid DESC
+            );
+        -- title words from `/r/<sub>/comments/<id>/<slug>/` urls,
+        -- kept up to date by postgres on every write
+        ALTER TABLE posts ADD COLUMN IF NOT EXISTS search_vector tsvector
+            GENERATED ALWAYS AS (to_tsvector('simple', translate(
+                substring(url from '/comments/[^/]+/([^/?#]+)'), '_-', '  '
+            ))) STORED;
+        CREATE INDEX IF NOT EXISTS posts_search_idx
+            ON posts USING gin (search_vector);
+        CREATE INDEX IF NOT EXISTS posts_category_trgm_idx
+            ON posts USING gin (category gin_trgm_ops);
     ''')
 
 
-def load_data(cursor, filename):
-    with open(filename) as f:
-        next(f)  # skip header
-        cursor.execute('''
-            CREATE TEMPORARY TABLE t (
-                uuid char(32) PRIMARY KEY,
-                url varchar(100),
-                username varchar(100),
-                user_karma integer,
-                cake_day date,
-                post_karma integer,
-                comment_karma integer,
-                post_date date,
-                comments integer,
-                votes integer,
-                category varchar(100)
+# summary table: (key column, its type)
+SUMMARIES = {
+    'category_stats': ('category', 'varchar(100)'),
+    'daily_stats': ('post_date', 'date'),
+    'author_stats': ('user_id', 'integer'),
+}
+
+# per row changes of summaries from trigger transition tables
+OLD_ROWS_DELTAS = '''
+            SELECT category, post_date, user_id, -1,
+                -coalesce(votes, 0), -coalesce(comments, 0)
+            FROM old_rows'''
+NEW_ROWS_DELTAS = '''
+            SELECT category, post_date, user_id, 1,
+                coalesce(votes, 0), coalesce(comments, 0)
+            FROM new_rows'''
+# transition tables and changes of a trigger per event
+STATS_TRIGGERS = {
+    'INSERT': ('NEW TABLE AS new_rows', NEW_ROWS_DELTAS),
+    'UPDATE': (
+        'OLD TABLE AS old_rows NEW TABLE AS new_rows',
+        OLD_ROWS_DELTAS + '\n            UNION ALL' + NEW_ROWS_DELTAS,
+    ),
+    'DELETE': ('OLD TABLE AS old_rows', OLD_ROWS_DELTAS),
+}
+
+# rows are upserted in key order, so concurrent writers lock
+# the shared summary rows in the same order and do not deadlock
+APPLY_SUMMARY = '''
+        WITH changes (category, post_date, user_id, posts, votes, comments)
+        AS ({deltas}
+        )
+        INSERT INTO {table} AS s ({key}, posts, votes, comments)
+        SELECT {key}, sum(posts), sum(votes), sum(comments)
+        FROM changes
+        WHERE {key} IS NOT NULL
+        GROUP BY {key}
+        ORDER BY {key}
+        ON CONFLICT ({key}) DO UPDATE SET
+            posts = s.posts + EXCLUDED.posts,
+            votes = s.votes + EXCLUDED.votes,
+            comments = s.comments + EXCLUDED.comments;
+'''
+# only keys of removed rows can run out of posts,
+# they are already locked by the upsert
+PRUNE_SUMMARY = '''
+        DELETE FROM {table}
+        WHERE posts <= 0
+        AND {key} IN (SELECT {key} FROM old_rows);
+'''
+
+
+def create_summaries(cursor):
+    """
+    Creates summary tables of posts by category, day and author.
+    They are kept up to date by statement level triggers on posts,
+    which apply only the changed rows, whatever writes them.
+    """
+    for table, (key, key_type) in SUMMARIES.items():
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                {key} {key_type} PRIMARY KEY,
+                posts bigint NOT NULL,
+                votes bigint NOT NULL,
+                comments bigint NOT NULL
             );
         ''')
-        cursor.copy_from(f, 't', sep=';')
-
-        cursor.execute('''
-            INSERT INTO users (
-                name,
-                total_karma,
-                cake_day,
-                post_karma,
-                comment_karma
-            )
-            SELECT
-                username,
-                user_karma,
-                cake_day,
-                post_karma,
-                comment_karma
-            FROM t;
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS category_stats_votes_idx
+            ON category_stats (votes DESC);
+        CREATE INDEX IF NOT EXISTS users_total_karma_idx
+            ON users (total_karma DESC);
+    ''')
+    # transition tables need a trigger per event
+    for event, (tables, deltas) in STATS_TRIGGERS.items():
+        name = f'posts_stats_{event.lower()}'
+        body = ''.join(
+            APPLY_SUMMARY.format(table=table, key=key, deltas=deltas)
+            + (PRUNE_SUMMARY.format(table=table, key=key)
+               if 'old_rows' in tables else '')
+            for table, (key, _) in SUMMARIES.items()
+        )
+        cursor.execute(f'''
+            CREATE OR REPLACE FUNCTION refresh_{name}() RETURNS trigger
+            AS $$
+            BEGIN
+            {body}
+            RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+            DROP TRIGGER IF EXISTS {name} ON posts;
+            CREATE TRIGGER {name}
+            AFTER {event} ON posts
+            REFERENCING {tables}
+            FOR EACH STATEMENT EXECUTE FUNCTION refresh_{name}();
         ''')
 
-        cursor.execute('''
-            DELETE FROM users
-            WHERE id NOT IN (
-                SELECT MIN(id) as id
-                FROM users
-                GROUP BY name
-            )
-        ''')
 
-        cursor.execute('''
-            INSERT INTO posts (
-                uuid,
-                url,
-                user_id,
-                post_date,
-                comments,
-                votes,
-                category
-            )
+def rebuild_summaries(cursor):
+    """
+    Recomputes summary tables from all posts,
+    needed once for posts written before `create_summaries`.
+    """
+    for table, (key, _) in SUMMARIES.items():
+        cursor.execute(f'''
+            TRUNCATE {table};
+            INSERT INTO {table} ({key}, posts, votes, comments)
             SELECT
-                t.uuid,
-                t.url,
-                u.id,
-                post_date,
-                comments,
-                votes,
-                category
-            FROM t
-            JOIN users as u
-            ON t.username = u.name;
+                {key},
+                count(*),
+                coalesce(sum(votes), 0),
+                coalesce(sum(comments), 0)
+            FROM posts
+            WHERE {key} IS NOT NULL
+            GROUP BY {key};
         ''')
 
 
-def get_all_data(cursor):
+LOAD_CHUNK_ROWS = 100000
+
+
+@metrics.timed('db_query_seconds', query='load_data')
+def load_data(
+    cursor,
+    filename: str,
+    chunk_rows: int = LOAD_CHUNK_ROWS,
+    verbose: bool = False,
+) -> int:
+    """
+    Loads parser CSV output in chunks of `chunk_rows` lines,
+    every chunk is copied to a temporary table, upserted and committed.
+    Only new and changed users and posts are written,
+    so loading the same file again changes nothing.
+    Returns number of rows read.
+    """
     cursor.execute('''
-        SELECT * FROM posts;
+        CREATE TEMPORARY TABLE IF NOT EXISTS load_posts (
+            uuid char(32),
+            url varchar(100),
+            username varchar(100),
+            user_karma integer,
+            cake_day date,
+            post_karma integer,
+            comment_karma integer,
+            post_date date,
+            comments integer,
+            votes integer,
+            category varchar(100)
+        );
     ''')
-    post_result = cursor.fetchall()
-    if len(post_result) == 0:
+    rows = 0
+    changed = 0
+    loaded_size = 0
+    start = time.perf_counter()
+    total_size = os.path.getsize(filename)
+    with open(filename, 'rb') as f:
+        loaded_size += len(next(f))  # skip header
+        while True:
+            lines = list(islice(f, chunk_rows))
+            if not lines:
+                break
+            chunk = b''.join(lines)
+            cursor.execute('TRUNCATE load_posts;')
+            cursor.copy_expert(
+                "COPY load_posts FROM STDIN WITH (FORMAT csv, DELIMITER ';')",
+                io.BytesIO(chunk),
+            )
+            rows += len(lines)
+            loaded_size += len(chunk)
+            cursor.execute(UPSERT_LOADED_USERS)
+            changed += cursor.rowcount
+            cursor.execute(UPSERT_LOADED_POSTS)
+            changed += cursor.rowcount
+            cursor.connection.commit()
+            if verbose:
+                elapsed = time.perf_counter() - start
+                print(
+                    f'Loaded {rows} rows ({loaded_size / total_size:.1%}),',
+                    f'{changed} changed, {rows / elapsed:.0f} rows/s'
+                )
+    cursor.execute('DROP TABLE load_posts;')
+    return rows
+
+
+POST_FIELDS = [
+    'post_uuid',
+    'url',
+    'username',
+    'user_karma',
+    'user_cakeday',
+    'post_karma',
+    'comment_karma',
+    'post_date',
+    'comments_number',
+    'votes_number',
+    'post_category',
+]
+DATE_FIELDS = ['user_cakeday', 'post_date']
+
+# columns in the order of POST_FIELDS
+SELECT_POSTS = '''
+    SELECT
+        p.uuid,
+        p.url,
+        u.name,
+        u.total_karma,
+        u.cake_day,
+        u.post_karma,
+        u.comment_karma,
+        p.post_date,
+        p.comments,
+        p.votes,
+        p.category
+    FROM posts AS p
+    JOIN users AS u
+    ON p.user_id = u.id
+'''
+
+
+# authors are identified by name, stats are taken from the newest post
+UPSERT_USERS = '''
+    INSERT INTO users (
+        name,
+        total_karma,
+        cake_day,
+        post_karma,
+        comment_karma
+    )
+    VALUES %s
+    ON CONFLICT (name) DO UPDATE SET
+        total_karma = EXCLUDED.total_karma,
+        cake_day = EXCLUDED.cake_day,
+        post_karma = EXCLUDED.post_karma,
+        comment_karma = EXCLUDED.comment_karma
+    RETURNING name, id
+'''
+
+INSERT_POSTS = '''
+    INSERT INTO posts (
+        uuid,
+        url,
+        user_id,
+        post_date,
+        comments,
+        votes,
+        category
+    )
+    VALUES %s;
+'''
+POST_VALUES = '''(
+    %(post_uuid)s,
+    %(url)s,
+    %(user_id)s,
+    %(post_date)s,
+    %(comments_number)s,
+    %(votes_number)s,
+    %(post_category)s
+)'''
+
+# rows equal to the stored ones are not updated
+UPSERT_LOADED_USERS = '''
+    INSERT INTO users (
+        name,
+        total_karma,
+        cake_day,
+        post_karma,
+        comment_karma
+    )
+    SELECT DISTINCT ON (username)
+        username,
+        user_karma,
+        cake_day,
+        post_karma,
+        comment_karma
+    FROM load_posts
+    ORDER BY username
+    ON CONFLICT (name) DO UPDATE SET
+        total_karma = EXCLUDED.total_karma,
+        cake_day = EXCLUDED.cake_day,
+        post_karma = EXCLUDED.post_karma,
+        comment_karma = EXCLUDED.comment_karma
+    WHERE (
+        users.total_karma,
+        users.cake_day,
+        users.post_karma,
+        users.comment_karma
+    ) IS DISTINCT FROM (
+        EXCLUDED.total_karma,
+        EXCLUDED.cake_day,
+        EXCLUDED.post_karma,
+        EXCLUDED.comment_karma
+    );
+'''
+UPSERT_LOADED_POSTS = '''
+    INSERT INTO posts (
+        uuid,
+        url,
+        user_id,
+        post_date,
+        comments,
+        votes,
+        category
+    )
+    SELECT DISTINCT ON (l.uuid)
+        l.uuid,
+        l.url,
+        u.id,
+        l.post_date,
+        l.comments,
+        l.votes,
+        l.category
+    FROM load_posts AS l
+    JOIN users AS u
+    ON l.username = u.name
+    ORDER BY l.uuid
+    ON CONFLICT (uuid) DO UPDATE SET
+        url = EXCLUDED.url,
+        user_id = EXCLUDED.user_id,
+        post_date = EXCLUDED.post_date,
+        comments = EXCLUDED.comments,
+        votes = EXCLUDED.votes,
+        category = EXCLUDED.category
+    WHERE (
+        posts.url,
+        posts.user_id,
+        posts.post_date,
+        posts.comments,
+        posts.votes,
+        posts.category
+    ) IS DISTINCT FROM (
+        EXCLUDED.url,
+        EXCLUDED.user_id,
+        EXCLUDED.post_date,
+        EXCLUDED.comments,
+        EXCLUDED.votes,
+        EXCLUDED.category
+    );
+'''
+
+# hot queries prepared once per pooled connection
+PREPARED = {
+    'post_by_uuid': SELECT_POSTS + 'WHERE p.uuid = %s;',
+    'upsert_user': UPSERT_USERS.replace(
+        'RETURNING name, id', 'RETURNING id'
+    ) % '(%s, %s, %s, %s, %s)',
+}
+
+
+class PreparedConnection(connection):
+    """
+    Connection preparing PREPARED statements when it is opened.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        with self.cursor() as cursor:
+            for name, query in PREPARED.items():
+                params = tuple(
+                    f'${i + 1}' for i in range(query.count('%s'))
+                )
+                cursor.execute(
+                    f'PREPARE {name} AS {query % params}'.rstrip(';')
+                )
+        self.commit()
+
+
+def execute_prepared(cursor, name, params):
+    """
+    Executes PREPARED query `name`, plainly if the connection
+    is not a PreparedConnection.
+    """
+    if isinstance(cursor.connection, PreparedConnection):
+        placeholders = ', '.join(['%s'] * len(params))
+        cursor.execute(f'EXECUTE {name} ({placeholders});', params)
+    else:
+        cursor.execute(PREPARED[name], params)
+
+
+def row_to_post(row):
+    post = dict(zip(POST_FIELDS, row))
+    for field in DATE_FIELDS:
+        if post[field] is not None:
+            post[field] = post[field].strftime('%d-%m-%y')
+    return post
+
+
+@metrics.timed('db_query_seconds', query='get_all_data')
+def get_all_data(cursor):
+    cursor.execute(SELECT_POSTS + ';')
+    data = [row_to_post(row) for row in cursor.fetchall()]
+    if len(data) == 0:
         raise RuntimeError('No posts!')
-    data = []
-    for row in post_result:
-        post = {}
-        post['post_uuid'] = row[0]
-        post['url'] = row[1]
-        post['user_id'] = row[2]
-        post['post_date'] = row[3].strftime('%d-%m-%y')
-        post['comments_number'] = row[4]
-        post['votes_number'] = row[5]
-        post['post_category'] = row[6]
-
-        cursor.execute('''
-            SELECT * FROM users
-            WHERE id = %s;
-        ''', [post['user_id']])
-        user_result = cursor.fetchone()
-        if user_result is None:
-            raise RuntimeError('No such user. How is it possible?')
-        post['username'] = user_result[1]
-        post['user_karma'] = user_result[2]
-        post['user_cakeday'] = user_result[3].strftime('%d-%m-%y')
-        post['post_karma'] = user_result[4]
-        post['comment_karma'] = user_result[5]
-        del post['user_id']
-        data.append(post)
     return data
 
 
-def get_data_by_uuid(cursor, uuid):
+PostsCursor = Tuple[Optional[datetime.date], str]
+
+# sort key of post dates matching the pagination indexes,
+# posts without date go after all others
+POSTS_DATE_KEY = "coalesce(p.post_date, '-infinity')"
+POSTS_ORDER = f'ORDER BY {POSTS_DATE_KEY} DESC, p.uuid DESC'
+POSTS_FILTERS = {
+    'post_category': 'p.category = %(post_category)s',
+    'username': 'u.name = %(username)s',
+    'date_from': 'p.post_date >= %(date_from)s',
+    'date_to': 'p.post_date <= %(date_to)s',
+}
+
+
+def encode_cursor(row) -> str:
+    post_date = '' if row[7] is None else row[7].isoformat()
+    return f'{post_date}_{row[0]}'
+
+
+def decode_cursor(value: str) -> PostsCursor:
+    """
+    Raises ValueError on malformed cursor.
+    """
+    post_date, post_uuid = value.split('_', 1)
+    if not post_date:
+        return None, post_uuid
+    return datetime.date.fromisoformat(post_date), post_uuid
+
+
+def filter_posts(
+    after: Optional[PostsCursor] = None, **filters
+) -> Tuple[str, dict]:
+    """
+    Returns query of posts matching `filters` which go after
+    the `after` post, newest first.
+    """
+    params = {k: v for k, v in filters.items() if v is not None}
+    conditions = [POSTS_FILTERS[k] for k in params]
+    if after is not None:
+        params['after_date'], params['after_uuid'] = after
+        # the sentinel stays in SQL, drivers disagree on infinite dates
+        after_date = '%(after_date)s'
+        if params['after_date'] is None:
+            after_date = "'-infinity'::date"
+            del params['after_date']
+        conditions.append(
+            f'({POSTS_DATE_KEY}, p.uuid) < ({after_date}, %(after_uuid)s)'
+        )
+    query = SELECT_POSTS
+    if conditions:
+        query += 'WHERE ' + ' AND '.join(conditions) + '\n'
+    return query + POSTS_ORDER, params
+
+
+@metrics.timed('db_query_seconds', query='get_posts_page')
+def get_posts_page(
+    cursor, limit: int, after: Optional[PostsCursor] = None, **filters
+) -> Tuple[List[dict], Optional[str]]:
+    """
+    Returns up to `limit` posts and cursor of the next page,
+    None on the last page.
+    """
+    query, params = filter_posts(after, **filters)
+    params['limit'] = limit + 1
+    cursor.execute(query + ' LIMIT %(limit)s;', params)
+    rows = cursor.fetchall()
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return [row_to_post(row) for row in rows[:limit]], next_cursor
+
+
+def iter_posts(
+    conn,
+    after: Optional[PostsCursor] = None,
+    batch_size: int = 1000,
+    **filters,
+) -> Iterator[dict]:
+    """
+    Yields matching posts through a server side cursor
+    holding only `batch_size` rows in memory.
+    """
+    query, params = filter_posts(after, **filters)
+    with conn.cursor(name=f'posts_{uuid.uuid4().hex}') as cursor:
+        cursor.itersize = batch_size
+        with metrics.timer('db_query_seconds', query='iter_posts'):
+            cursor.execute(query + ';', params)
+        for row in cursor:
+            yield row_to_post(row)
+
+
+SEARCH_CONDITIONS = {
+    'q': "p.search_vector @@ websearch_to_tsquery('simple', %(q)s)",
+    'post_category': 'p.category ILIKE %(post_category_pattern)s',
+    'username': 'u.name ILIKE %(username_pattern)s',
+}
+SEARCH_RANKS = {
+    'q': "ts_rank(p.search_vector, websearch_to_tsquery('simple', %(q)s))",
+    'post_category': 'similarity(p.category, %(post_category)s)',
+    'username': 'similarity(u.name, %(username)s)',
+}
+
+
+@metrics.timed('db_query_seconds', query='search_posts')
+def search_posts(
+    cursor, limit: int, offset: int = 0, **terms
+) -> Tuple[List[dict], bool]:
+    """
+    Finds posts by title words (`q`, web search syntax)
+    and substrings of `post_category` and `username`,
+    best matches first. Returns found posts and whether
+    there are more of them.
+    """
+    cursor.execute(*search_query(limit + 1, offset, **terms))
+    rows = cursor.fetchall()
+    return [row_to_post(row) for row in rows[:limit]], len(rows) > limit
+
+
+def search_query(limit: int, offset: int, **terms) -> Tuple[str, dict]:
+    params = {k: v for k, v in terms.items() if v}
+    if not params:
+        raise ValueError('No search terms')
+    conditions = ' AND '.join(SEARCH_CONDITIONS[k] for k in params)
+    rank = ' + '.join(SEARCH_RANKS[k] for k in params)
+    for key in ('post_category', 'username'):
+        if key in params:
+            params[f'{key}_pattern'] = '%' + like_escape(params[key]) + '%'
+    query = (
+        SELECT_POSTS
+        + f'WHERE {conditions}\n'
+        + f'ORDER BY {rank} DESC, {POSTS_DATE_KEY} DESC, p.uuid DESC\n'
+        + 'LIMIT %(limit)s OFFSET %(offset)s;'
+    )
+    params.update(limit=limit, offset=offset)
+    return query, params
+
+
+def like_escape(value: str) -> str:
+    return (
+        value.replace('\\', '\\\\')
+        .replace('%', '\\%')
+        .replace('_', '\\_')
+    )
+
+
+@metrics.timed('db_query_seconds', query='get_category_stats')
+def get_category_stats(cursor, limit: int) -> List[dict]:
+    """
+    Categories with the most votes.
+    """
     cursor.execute('''
-        SELECT * FROM posts
-        WHERE uuid = %s;
-    ''', [uuid])
-    post_result = cursor.fetchone()
-    if post_result is None:
-        raise RuntimeError('No such post')
-    data = {}
-    data['post_uuid'] = post_result[0]
-    data['url'] = post_result[1]
-    data['user_id'] = post_result[2]
-    data['post_date'] = post_result[3].strftime('%d-%m-%y')
-    data['comments_number'] = post_result[4]
-    data['votes_number'] = post_result[5]
-    data['post_category'] = post_result[6]
+        SELECT category, posts, votes, comments
+        FROM category_stats
+        ORDER BY votes DESC
+        LIMIT %s;
+    ''', [limit])
+    return [
+        dict(zip(['post_category', 'posts', 'votes', 'comments'], row))
+        for row in cursor.fetchall()
+    ]
+
 
+@metrics.timed('db_query_seconds', query='get_top_authors')
+def get_top_authors(cursor, limit: int) -> List[dict]:
+    """
+    Authors with the most karma and totals of their stored posts.
+    """
     cursor.execute('''
-        SELECT * FROM users
-        WHERE id = %s;
-    ''', [data['user_id']])
-    user_result = cursor.fetchone()
-    if user_result is None:
-        raise RuntimeError('No such user. How is it possible?')
-    data['username'] = user_result[1]
-    data['user_karma'] = user_result[2]
-    data['user_cakeday'] = user_result[3].strftime('%d-%m-%y')
-    data['post_karma'] = user_result[4]
-    data['comment_karma'] = user_result[5]
-    del data['user_id']
-    return data
+        SELECT
+            u.name,
+            u.total_karma,
+            u.post_karma,
+            u.comment_karma,
+            s.posts,
+            s.votes,
+            s.comments
+        FROM users AS u
+        JOIN author_stats AS s
+        ON s.user_id = u.id
+        ORDER BY u.total_karma DESC
+        LIMIT %s;
+    ''', [limit])
+    fields = [
+        'username',
+        'user_karma',
+        'post_karma',
+        'comment_karma',
+        'posts',
+        'votes',
+        'comments',
+    ]
+    return [dict(zip(fields, row)) for row in cursor.fetchall()]
 
 
-def insert_data(cursor, data):
+@metrics.timed('db_query_seconds', query='get_daily_stats')
+def get_daily_stats(
+    cursor,
+    date_from: Optional[datetime.date] = None,
+    date_to: Optional[datetime.date] = None,
+) -> List[dict]:
     cursor.execute('''
-        SELECT id FROM users
-        WHERE name = %(username)s;
-    ''', data)
-    result = cursor.fetchall()
-    if len(result) == 0:  # no such user
-        cursor.execute('''
-            INSERT INTO users (
-                name,
-                total_karma,
-                cake_day,
-                post_karma,
-                comment_karma
-            )
-            VALUES (
-                %(username)s,
-                %(user_karma)s,
-                %(user_cakeday)s,
-                %(post_karma)s,
-                %(comment_karma)s
-            );
-        ''', data)
-        cursor.execute('''
-            SELECT id FROM users
-            WHERE name = %(username)s;
-        ''')
-        data['user_id'] = cursor.fetchall()[0][0]
-    else:
-        data['user_id'] = result[0][0]
+        SELECT post_date, posts, votes, comments
+        FROM daily_stats
+        WHERE post_date >= coalesce(%(date_from)s, '-infinity'::date)
+        AND post_date <= coalesce(%(date_to)s, 'infinity'::date)
+        ORDER BY post_date;
+    ''', {'date_from': date_from, 'date_to': date_to})
+    return [
+        {
+            'post_date': row[0].strftime('%d-%m-%y'),
+            'posts': row[1],
+            'votes': row[2],
+            'comments': row[3],
+        }
+        for row in cursor.fetchall()
+    ]
+
 
+@metrics.timed('db_query_seconds', query='get_data_by_uuid')
+def get_data_by_uuid(cursor, uuid):
+    execute_prepared(cursor, 'post_by_uuid', [uuid])
+    result = cursor.fetchone()
+    if result is None:
+        raise RuntimeError('No such post')
+    return row_to_post(result)
+
+
+@metrics.timed('db_query_seconds', query='insert_data')
+def insert_data(cursor, data):
+    execute_prepared(cursor, 'upsert_user', [
+        data['username'],
+        data['user_karma'],
+        data['user_cakeday'],
+        data['post_karma'],
+        data['comment_karma'],
+    ])
+    data['user_id'] = cursor.fetchone()[0]
     data['post_uuid'] = uuid.uuid1().hex
-    cursor.execute('''
-        INSERT INTO posts (
-            uuid,
-            url,
-            user_id,
-            post_date,
-            comments,
-            votes,
-            category
-        )
-        VALUES (
-            %(post_uuid)s,
-            %(url)s,
-            %(user_id)s,
-            %(post_date)s,
-            %(comments_number)s,
-            %(votes_number)s,
-            %(post_category)s
-        );
-    ''', data)
+    cursor.execute(INSERT_POSTS % POST_VALUES, data)
     return data['post_uuid']
 
 
+@metrics.timed('db_query_seconds', query='insert_posts')
+def insert_posts(cursor, posts: List[dict], page_size: int = 1000):
+    """
+    Inserts posts in multi-row statements, authors are upserted once.
+    Returns uuids of the posts in the same order.
+    """
+    users = {post['username']: post for post in posts}
+    rows = execute_values(cursor, UPSERT_USERS, [
+        (
+            user['username'],
+            user['user_karma'],
+            user['user_cakeday'],
+            user['post_karma'],
+            user['comment_karma'],
+        )
+        # concurrent bulk inserts lock shared authors in the same order
+        # instead of deadlocking
+        for _, user in sorted(users.items())
+    ], page_size=page_size, fetch=True)
+    user_ids = dict(rows)
+    for post in posts:
+        post['user_id'] = user_ids[post['username']]
+        post['post_uuid'] = uuid.uuid1().hex
+    execute_values(
+        cursor, INSERT_POSTS % '%s', posts,
+        template=POST_VALUES, page_size=page_size
+    )
+    return [post['post_uuid'] for post in posts]
+
+
 def translate_keys(to, data):
     # json, db
     pairs = [
@@ -248,6 +760,7 @@ def translate_keys(to, data):
     }
 
 
+@metrics.timed('db_query_seconds', query='update_data')
 def update_data(cursor, uuid, data):
     cursor.execute(
         'SELECT user_id FROM posts WHERE uuid = %s;', [uuid]
@@ -309,6 +822,7 @@ def update_data(cursor, uuid, data):
         cursor.execute(sql_query, user_data)
 
 
+@metrics.timed('db_query_seconds', query='delete_data')
 def delete_data(cursor, uuid):
     cursor.execute(
         'DELETE FROM posts WHERE uuid = %s', [uuid]
@@ -324,6 +838,61 @@ def connect_to_redditdb(user, password):
     )
 
 
+def db_config(environ=os.environ) -> dict:
+    """
+    Connection parameters from REDDITDB_NAME, REDDITDB_USER,
+    REDDITDB_PASSWORD, REDDITDB_HOST and REDDITDB_PORT.
+    """
+    return {
+        'dbname': environ.get('REDDITDB_NAME', 'redditdb'),
+        'user': environ.get('REDDITDB_USER', ''),
+        'password': environ.get('REDDITDB_PASSWORD', ''),
+        'host': environ.get('REDDITDB_HOST', 'localhost'),
+        'port': int(environ.get('REDDITDB_PORT', 5432)),
+    }
+
+
+class BlockingConnectionPool(ThreadedConnectionPool):
+    """
+    ThreadedConnectionPool whose `getconn` waits up to `timeout` seconds
+    for a free connection instead of raising PoolError at once.
+    """
+
+    def __init__(self, minconn, maxconn, *args, timeout=30.0, **kwargs):
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(maxconn)
+        super().__init__(minconn, maxconn, *args, **kwargs)
+
+    def getconn(self, key=None):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolError('connection pool exhausted')
+        try:
+            return super().getconn(key)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn=None, key=None, close=False):
+        try:
+            super().putconn(conn, key, close)
+        finally:
+            self._slots.release()
+
+
+def create_pool(environ=os.environ) -> BlockingConnectionPool:
+    """
+    Creates a pool of PreparedConnection configured by `db_config`,
+    REDDITDB_POOL_MIN, REDDITDB_POOL_MAX and REDDITDB_POOL_TIMEOUT.
+    """
+    return BlockingConnectionPool(
+        int(environ.get('REDDITDB_POOL_MIN', 1)),
+        int(environ.get('REDDITDB_POOL_MAX', 10)),
+        timeout=float(environ.get('REDDITDB_POOL_TIMEOUT', 30)),
+        connection_factory=PreparedConnection,
+        **db_config(environ),
+    )
+
+
 if __name__ == '__main__':
     conn = pg.connect(
         dbname='redditdb',
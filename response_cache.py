@@ -0,0 +1,77 @@
+import hashlib
+import threading
+from typing import Callable, Hashable, NamedTuple, Optional, Tuple
+
+from cache import LRUCache
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    etag: str
+    headers: dict
+
+
+class ResponseCache:
+    """
+    Rendered API responses with ETags: single posts by uuid
+    and list pages by query. Single posts are invalidated one by one,
+    pages on every write since any write may move posts between them.
+    Every write bumps `generation`, so a response built
+    before a write is not stored after it.
+    Entries expire after `ttl` seconds, which bounds how long
+    writes of other processes stay unseen.
+    """
+
+    KINDS = ('post', 'page')
+
+    def __init__(self, max_size: int = 10000, ttl: Optional[float] = None):
+        self.generation = 0
+        self._caches = {kind: LRUCache(max_size, ttl) for kind in self.KINDS}
+        self._lock = threading.Lock()
+
+    def get_or_build(
+        self,
+        kind: str,
+        key: Hashable,
+        build: Callable[[], Tuple[bytes, dict]],
+    ) -> CachedResponse:
+        """
+        Returns cached response or builds it with `build`
+        returning a body and extra headers.
+        """
+        cached = self._caches[kind].get(key)
+        if cached is not None:
+            return cached
+        generation = self.generation
+        body, headers = build()
+        cached = CachedResponse(
+            body, hashlib.sha1(body).hexdigest(), headers
+        )
+        with self._lock:
+            if generation == self.generation:
+                self._caches[kind].set(key, cached)
+        return cached
+
+    def invalidate_post(self, post_uuid: str):
+        with self._lock:
+            self.generation += 1
+            self._caches['post'].delete(post_uuid)
+            self._caches['page'].clear()
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            for cache in self._caches.values():
+                cache.clear()
+
+    def stats(self) -> dict:
+        stats = {}
+        for kind, cache in self._caches.items():
+            total = cache.hits + cache.misses
+            stats[kind] = {
+                'size': len(cache),
+                'hits': cache.hits,
+                'misses': cache.misses,
+                'hit_rate': cache.hits / total if total else 0.0,
+            }
+        return stats
@@ -0,0 +1,299 @@
+import argparse
+import multiprocessing as mp
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Callable, Iterator, List, Optional
+
+import pandas as pd
+
+from backends import FetchBackend
+from cache import UserInfo
+from parser import RedditParser
+
+
+@dataclass
+class CrawlJob:
+    link: str
+    num_posts: int
+    backend: str = 'http'
+
+
+class RateLimiter:
+    """
+    Global requests per second budget shared by worker processes.
+    Every request takes the next free time slot.
+    """
+
+    def __init__(self, rate: float, lock=None, next_slot=None):
+        self.interval = 1 / rate
+        self._lock = lock or mp.Lock()
+        self._next_slot = next_slot or mp.Value('d', 0.0, lock=False)
+
+    def __getstate__(self):
+        return self.interval, self._lock, self._next_slot
+
+    def __setstate__(self, state):
+        self.interval, self._lock, self._next_slot = state
+
+    def wait(self):
+        with self._lock:
+            now = time.time()
+            slot = max(now, self._next_slot.value)
+            self._next_slot.value = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+# value of a profile being fetched, followed by a claim token
+PENDING = 'pending'
+
+
+class SharedUserCache:
+    """
+    User profiles shared by worker processes through a manager dict.
+    Has the same interface as UserInfoCache,
+    profiles being fetched are reported as missing.
+    """
+
+    def __init__(
+        self,
+        users,
+        claim_timeout: float = 60.0,
+        poll_interval: float = 0.1,
+    ):
+        self._users = users
+        self._lock = threading.Lock()
+        self.claim_timeout = claim_timeout
+        self.poll_interval = poll_interval
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, username: str) -> Optional[UserInfo]:
+        user_info = self._users.get(username)
+        if is_pending(user_info):
+            user_info = None
+        with self._lock:
+            if user_info is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return user_info
+
+    def fetch(
+        self, username: str, fetch: Callable[[str], Optional[UserInfo]]
+    ) -> Optional[UserInfo]:
+        """
+        Claims the profile with a pending marker and fetches it,
+        or waits for the worker which claimed it first,
+        but not longer than `claim_timeout`.
+        """
+        deadline = time.monotonic() + self.claim_timeout
+        while True:
+            claim = (PENDING, uuid.uuid4().hex)
+            user_info = self._users.setdefault(username, claim)
+            if user_info == claim or time.monotonic() > deadline:
+                break
+            if not is_pending(user_info):
+                return user_info
+            time.sleep(self.poll_interval)
+        try:
+            user_info = fetch(username)
+        finally:
+            if user_info is None or is_pending(user_info):
+                # not loaded, let other workers try again
+                self._users.pop(username, None)
+        if user_info is not None:
+            self._users[username] = user_info
+        return user_info
+
+    def set(self, username: str, user_info: UserInfo):
+        self._users[username] = user_info
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
+
+
+class RateLimitedBackend(FetchBackend):
+    """
+    Takes a slot from the limiter before every page request
+    of the wrapped backend.
+    """
+
+    def __init__(self, backend: FetchBackend, limiter: RateLimiter):
+        self.backend = backend
+        self.limiter = limiter
+
+    def iter_feed(self, incremental: bool = True) -> Iterator[List[dict]]:
+        feed = self.backend.iter_feed(incremental)
+        while True:
+            self.limiter.wait()
+            batch = next(feed, None)
+            if batch is None:
+                return
+            yield batch
+
+    def get_user_info(self, username: str) -> Optional[UserInfo]:
+        self.limiter.wait()
+        return self.backend.get_user_info(username)
+
+    def stats(self) -> List[str]:
+        return self.backend.stats()
+
+    def close(self):
+        self.backend.close()
+
+
+class SharedProfileBackend(FetchBackend):
+    """
+    Fetches every profile in one worker process at a time,
+    other workers wait for its result in `user_cache`.
+    """
+
+    def __init__(self, backend: FetchBackend, user_cache: SharedUserCache):
+        self.backend = backend
+        self.user_cache = user_cache
+
+    def iter_feed(self, incremental: bool = True) -> Iterator[List[dict]]:
+        return self.backend.iter_feed(incremental)
+
+    def get_user_info(self, username: str) -> Optional[UserInfo]:
+        return self.user_cache.fetch(username, self.backend.get_user_info)
+
+    def stats(self) -> List[str]:
+        return self.backend.stats()
+
+    def close(self):
+        self.backend.close()
+
+
+def is_pending(user_info) -> bool:
+    return isinstance(user_info, tuple) and user_info[:1] == (PENDING,)
+
+
+# state of a worker process, set by `_init_worker`
+_worker = {}
+
+
+def _init_worker(limiter: RateLimiter, users, profile_workers: int):
+    _worker['limiter'] = limiter
+    _worker['user_cache'] = SharedUserCache(users)
+    _worker['profile_workers'] = profile_workers
+
+
+def _create_backend(job: CrawlJob, num_workers: int) -> FetchBackend:
+    if job.backend == 'http':
+        from http_backend import HttpBackend
+        return HttpBackend(job.link, num_workers)
+    if job.backend == 'selenium':
+        from selenium_backend import SeleniumBackend
+        return SeleniumBackend(job.link, num_workers)
+    raise ValueError(f'Unknown backend: {job.backend}')
+
+
+def crawl(job: CrawlJob) -> pd.DataFrame:
+    """
+    Runs one job in a worker process.
+    """
+    num_workers = _worker['profile_workers']
+    user_cache = _worker['user_cache']
+    backend = SharedProfileBackend(
+        RateLimitedBackend(
+            _create_backend(job, num_workers), _worker['limiter']
+        ),
+        user_cache,
+    )
+    parser = RedditParser(
+        job.link,
+        num_workers=num_workers,
+        user_cache=user_cache,
+        backend=backend,
+    )
+    try:
+        posts = parser.get_posts_data(job.num_posts)
+    finally:
+        parser.close()
+    posts['feed'] = job.link
+    return posts
+
+
+def run_jobs(
+    jobs: List[CrawlJob],
+    num_processes: int,
+    requests_per_second: float,
+    profile_workers: int = 1,
+    verbose: bool = False,
+) -> pd.DataFrame:
+    """
+    Spreads jobs over a process pool and merges results
+    into one frame, a post found in several feeds is kept once.
+    """
+    with mp.Manager() as manager:
+        users = manager.dict()
+        limiter = RateLimiter(requests_per_second)
+        results = []
+        with ProcessPoolExecutor(
+            max_workers=num_processes,
+            initializer=_init_worker,
+            initargs=(limiter, users, profile_workers),
+        ) as pool:
+            futures = {pool.submit(crawl, job): job for job in jobs}
+            for future in as_completed(futures):
+                job = futures[future]
+                try:
+                    posts = future.result()
+                except Exception as e:
+                    print(f'Failed to crawl {job.link}: {e!r}')
+                    continue
+                if verbose:
+                    print(f'Crawled {len(posts)} posts from {job.link}')
+                results.append(posts)
+    if not results:
+        return pd.DataFrame(columns=RedditParser.DATA_ORDER + ['feed'])
+    return pd.concat(results, ignore_index=True).drop_duplicates('url')
+
+
+def read_jobs(filename: str, backend: str) -> List[CrawlJob]:
+    """
+    Reads jobs from lines of `<feed link> <number of posts>`.
+    """
+    jobs = []
+    with open(filename) as f:
+        for line in f:
+            if line.strip() and not line.startswith('#'):
+                link, num_posts = line.split()
+                jobs.append(CrawlJob(link, int(num_posts), backend))
+    return jobs
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(
+        description='Crawls many feeds in parallel'
+    )
+    arg_parser.add_argument('feeds', help='file of `<link> <posts>` lines')
+    arg_parser.add_argument('--processes', type=int, default=4)
+    arg_parser.add_argument('--profile-workers', type=int, default=1)
+    arg_parser.add_argument('--rps', type=float, default=5.0)
+    arg_parser.add_argument(
+        '--backend', choices=['selenium', 'http'], default='http'
+    )
+    args = arg_parser.parse_args()
+
+    output_file = f"reddit-{time.strftime('%Y%m%d%H%M')}.csv"  # noqa: E228
+    start = time.time()
+    posts = run_jobs(
+        read_jobs(args.feeds, args.backend),
+        args.processes,
+        args.rps,
+        args.profile_workers,
+        verbose=True,
+    )
+    print(f'Elapsed time: {time.time() - start:.3f}s')
+    posts.to_csv(output_file, sep=';', index=False)
@@ -0,0 +1,287 @@
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Optional
+
+from bs4 import BeautifulSoup
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.common.keys import Keys
+from selenium.webdriver.common.action_chains import ActionChains
+from selenium.webdriver.common.by import By
+
+from backends import FetchBackend
+from driver_pool import DriverPool, browser_rss, create_driver
+from cache import UNAVAILABLE, UserInfo
+from extractors import (
+    PostExtractor,
+    ProfileExtractor,
+    get_extractor,
+    parse_cakeday,
+    parse_karma,
+    parse_karma_popup,
+)
+from fixtures import Capture
+import metrics
+from waits import PageWaiter, count_children, format_stats
+
+
+class SeleniumBackend(FetchBackend):
+    """
+    Renders feed and user profiles in headless Firefox.
+    The feed is scrolled in the main driver,
+    profiles are loaded by a pool of `num_workers` drivers.
+    """
+
+    POSTS_BLOCK_CLASS = 'rpBJOHq2PR60pnwJlUyP0'
+    USER_BASE_LINK = 'https://www.reddit.com/user/'
+    KARMA_SPAN_ID = ProfileExtractor.KARMA_SPAN_ID
+    CAKEDAY_SPAN_ID = ProfileExtractor.CAKEDAY_SPAN_ID
+    KARMA_POPUP_CLASS = ProfileExtractor.KARMA_POPUP_CLASS
+    ADULT_GATE_XPATH = ProfileExtractor.ADULT_GATE_XPATH
+    NEW_POSTS_SCRIPT = '''
+        const block = document.getElementsByClassName(arguments[0])[0];
+        if (!block) return [];
+        const posts = [];
+        for (let i = arguments[1]; i < block.children.length; i++) {
+            posts.push(block.children[i].outerHTML);
+        }
+        return posts;
+    '''
+    PRUNE_POSTS_SCRIPT = '''
+        const block = document.getElementsByClassName(arguments[0])[0];
+        if (!block) return;
+        for (let i = arguments[1]; i < arguments[2]; i++) {
+            const post = block.children[i];
+            // empty placeholder keeps indexes and scroll height valid
+            post.style.height = post.offsetHeight + 'px';
+            post.replaceChildren();
+        }
+    '''
+    PAGE_SIZE_SCRIPT = '''
+        return [
+            document.getElementsByTagName('*').length,
+            document.documentElement.outerHTML.length,
+        ];
+    '''
+
+    def __init__(
+        self,
+        link: str,
+        num_workers: int = 1,
+        waiter: Optional[PageWaiter] = None,
+        extractor: Optional[PostExtractor] = None,
+        capture: Optional[Capture] = None,
+        driver_pool: Optional[DriverPool] = None,
+        memory_bounded: bool = False,
+    ):
+        """
+        If `capture` is given, new feed posts and rendered
+        profile pages are saved to it for offline replay.
+        If `driver_pool` is given, warm drivers are taken from it
+        and returned on close instead of starting new browsers.
+        In `memory_bounded` mode processed posts are emptied
+        in the page after extraction (incremental mode only),
+        and browser memory is tracked per scroll in `memory_log`.
+        """
+        self.link = link
+        self.capture = capture
+        self.waiter = waiter or PageWaiter()
+        self.extractor = extractor or get_extractor()
+        self.driver_pool = driver_pool
+        self.memory_bounded = memory_bounded
+        self.memory_log = []
+        self.driver = None
+        self._profile_drivers = queue.Queue()
+
+        # profile drivers are started in parallel with the feed driver
+        profile_drivers = []
+        started = False
+        try:
+            with ThreadPoolExecutor(max_workers=num_workers) as pool:
+                profile_drivers = [
+                    pool.submit(self._take_driver)
+                    for _ in range(num_workers)
+                ]
+                self.driver = self._take_driver()
+                self._load_page(self.driver, self.link, 'feed')
+            started = True
+        finally:
+            errors = [
+                driver.exception() for driver in profile_drivers
+                if driver.exception() is not None
+            ]
+            for driver in profile_drivers:
+                if driver.exception() is None:
+                    self._profile_drivers.put(driver.result())
+            if errors or not started:
+                # do not leak browsers which were started
+                self.close()
+        if errors:
+            raise errors[0]
+
+    def close(self):
+        while not self._profile_drivers.empty():
+            self._give_back_driver(self._profile_drivers.get_nowait())
+        if self.driver is not None:
+            self._give_back_driver(self.driver)
+            self.driver = None
+
+    def _take_driver(self) -> webdriver.Firefox:
+        if self.driver_pool is not None:
+            return self.driver_pool.acquire()
+        return create_driver()
+
+    def _give_back_driver(self, driver: webdriver.Firefox):
+        if self.driver_pool is not None:
+            self.driver_pool.release(driver)
+        else:
+            driver.quit()
+
+    def _load_page(self, driver: webdriver.Firefox, link: str, page: str):
+        with metrics.timer('parser_page_load_seconds', page=page):
+            driver.get(link)
+        if self.driver_pool is not None:
+            self.driver_pool.count_page(driver)
+
+    def iter_feed(self, incremental: bool = True) -> Iterator[List[dict]]:
+        """
+        In incremental mode only new posts are pulled from the page
+        after each scroll instead of the whole page source.
+        """
+        seen_posts = 0
+        while True:
+            if incremental:
+                new_posts = self._get_new_posts(seen_posts)
+            else:
+                with metrics.timer('parser_parse_seconds', source='page'):
+                    new_posts = self.extractor.from_page(
+                        self.driver.page_source, self.POSTS_BLOCK_CLASS
+                    )[seen_posts:]
+            batch = []
+            for post in new_posts:
+                with metrics.timer('parser_extract_seconds'):
+                    batch.append(self.extractor.extract(post))
+            if self.memory_bounded and incremental:
+                self.driver.execute_script(
+                    self.PRUNE_POSTS_SCRIPT, self.POSTS_BLOCK_CLASS,
+                    seen_posts, seen_posts + len(new_posts)
+                )
+            seen_posts += len(new_posts)
+            if self.memory_bounded:
+                self._log_memory(seen_posts)
+            yield batch
+            # scroll to the end of page to load more posts
+            if not self._scroll_feed():
+                # feed is exhausted or stuck
+                return
+
+    def get_user_info(self, username: str) -> Optional[UserInfo]:
+        driver = self._profile_drivers.get()
+        try:
+            return self._get_user_info(username, driver)
+        except WebDriverException:  # page load timeout or broken page
+            metrics.inc('parser_profile_errors_total')
+            return None
+        finally:
+            self._profile_drivers.put(driver)
+
+    def stats(self) -> List[str]:
+        lines = format_stats(self.waiter.stats())
+        if self.memory_log:
+            last = self.memory_log[-1]
+            peak_rss = max(m['rss'] for m in self.memory_log)
+            lines.append(
+                f"Feed memory after {last['posts']} posts: "
+                f"{last['dom_nodes']} DOM nodes, "
+                f"{last['html_size'] / 1024:.0f} KB HTML, "
+                f"peak RSS {peak_rss / 1024 ** 2:.0f} MB"
+            )
+        return lines
+
+    def _log_memory(self, seen_posts: int):
+        dom_nodes, html_size = self.driver.execute_script(
+            self.PAGE_SIZE_SCRIPT
+        )
+        self.memory_log.append({
+            'posts': seen_posts,
+            'dom_nodes': dom_nodes,
+            'html_size': html_size,
+            'rss': browser_rss(self.driver),
+        })
+
+    def _get_new_posts(self, seen_posts: int) -> list:
+        """
+        Returns posts block children starting from `seen_posts`,
+        only their HTML is serialized and parsed.
+        """
+        new_posts_html = self.driver.execute_script(
+            self.NEW_POSTS_SCRIPT, self.POSTS_BLOCK_CLASS, seen_posts
+        )
+        if self.capture is not None:
+            self.capture.save_feed(new_posts_html)
+        with metrics.timer('parser_parse_seconds', source='fragments'):
+            return self.extractor.from_fragments(new_posts_html)
+
+    @metrics.timed('parser_scroll_seconds')
+    def _scroll_feed(self) -> bool:
+        """
+        Scrolls to the end of the feed and waits until new posts load.
+        Returns False if no new posts appeared.
+        """
+        body = self.driver.find_element_by_tag_name('body')
+        seen_children = count_children(self.driver, self.POSTS_BLOCK_CLASS)
+        body.send_keys(Keys.END)
+        grown = self.waiter.feed_growth(
+            self.driver, self.POSTS_BLOCK_CLASS, seen_children,
+            on_retry=lambda: body.send_keys(Keys.END)
+        )
+        return grown is not None
+
+    def _get_user_info(
+        self, username: str, driver: webdriver.Firefox
+    ) -> Optional[UserInfo]:
+        link = self.USER_BASE_LINK + username
+
+        # load a page and wait for karma or 18+ gate to render
+        self._load_page(driver, link, 'profile')
+        with metrics.timer('parser_profile_wait_seconds', stage='karma'):
+            found = self.waiter.first_present(
+                driver,
+                [
+                    (By.ID, self.KARMA_SPAN_ID),
+                    (By.XPATH, self.ADULT_GATE_XPATH),
+                ],
+                on_retry=driver.refresh,
+            )
+        if found is None:  # stuck page
+            return None
+        gate, karma_span = found
+        if gate:  # 18+ page
+            if self.capture is not None:
+                self.capture.save_profile(username, driver.page_source)
+            return UNAVAILABLE
+
+        # get user karma and cakeday
+        user_karma = parse_karma(karma_span.get_attribute('textContent'))
+        user_cakeday = parse_cakeday(driver.find_element_by_id(
+            self.CAKEDAY_SPAN_ID
+        ).get_attribute('textContent'))
+
+        # hover mouse to karma and wait until karma details popup appears
+        hover = ActionChains(driver).move_to_element(karma_span)
+        with metrics.timer('parser_profile_wait_seconds', stage='popup'):
+            hover.perform()
+            karma_popup_element = self.waiter.visibility(
+                driver, self.KARMA_POPUP_CLASS, on_retry=hover.perform
+            )
+        if karma_popup_element is None:  # stuck popup
+            return None
+        if self.capture is not None:
+            self.capture.save_profile(username, driver.page_source)
+        karma_popup = BeautifulSoup(
+            karma_popup_element.get_attribute('outerHTML'), 'html.parser'
+        )
+
+        # get post and comment karma
+        post_karma, comment_karma = parse_karma_popup(karma_popup.text)
+        return user_karma, user_cakeday, post_karma, comment_karma
@@ -1,54 +1,189 @@
-from flask import Flask, jsonify, request, abort
-from flask import g
+import datetime
+import json
+import os
+import threading
+import time
+from urllib.parse import urlencode
+
+from flask import Flask, Response, jsonify, request, abort
+from flask import g, stream_with_context
 from flask.views import MethodView
+import psycopg2
+from psycopg2.pool import PoolError
+import metrics
 import postgres as pg
+from response_cache import CachedResponse, ResponseCache
 
 
 app = Flask(__name__)
 
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+NDJSON = 'application/x-ndjson'
+BULK_CHUNK_SIZE = 1000
+DATA_KEYS = frozenset([
+    'url',
+    'post_date',
+    'comments_number',
+    'votes_number',
+    'post_category',
+    'username',
+    'user_karma',
+    'user_cakeday',
+    'post_karma',
+    'comment_karma',
+])
+USER_KEYS = frozenset([
+    'username',
+    'user_karma',
+    'user_cakeday',
+    'post_karma',
+    'comment_karma',
+])
+
+# writes of other processes (load.py, other workers) show up
+# after POSTS_CACHE_TTL seconds
+response_cache = ResponseCache(
+    int(os.environ.get('POSTS_CACHE_SIZE', 10000)),
+    float(os.environ.get('POSTS_CACHE_TTL', 60)),
+)
+
+# connections shared by request threads, see `postgres.create_pool`
+pool = None
+pool_lock = threading.Lock()
+
+
+def get_pool():
+    global pool
+    with pool_lock:
+        if pool is None:
+            pool = pg.create_pool()
+    return pool
+
 
 def get_connection():
     if not hasattr(g, 'conn'):
-        g.conn = pg.connect_to_redditdb('ivan2', 'qweqwe')
+        try:
+            g.conn = get_pool().getconn()
+        except PoolError:
+            # no connection freed up within REDDITDB_POOL_TIMEOUT
+            abort(503, description='Database is busy.')
     return g.conn
 
 
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def observe_latency(response):
+    # streamed responses are measured up to the first byte
+    metrics.observe(
+        'http_request_duration_seconds',
+        time.perf_counter() - g.request_start,
+        route=request.url_rule.rule if request.url_rule else 'unmatched',
+        method=request.method,
+        status=response.status_code,
+    )
+    return response
+
+
 @app.teardown_appcontext
 def close_db_connection(error):
-    if hasattr(g, 'conn'):
-        g.conn.close()
+    if not hasattr(g, 'conn'):
+        return
+    conn = g.conn
+    if not conn.closed:
+        try:
+            # drop uncommitted changes and server side cursors
+            conn.rollback()
+        except psycopg2.Error:
+            pass
+    # broken connections are replaced by the pool
+    get_pool().putconn(conn, close=bool(conn.closed))
 
 
 class PostAPI(MethodView):
 
     def __init__(self):
-        self.data_keys = set([
-            'url',
-            'post_date',
-            'comments_number',
-            'votes_number',
-            'post_category',
-            'username',
-            'user_karma',
-            'user_cakeday',
-            'post_karma',
-            'comment_karma'
-        ])
-        self.cursor = get_connection().cursor()
+        self.data_keys = DATA_KEYS
+        self._cursor = None
         super().__init__()
 
     def __del__(self):
-        self.cursor.close()
+        if self._cursor is not None:
+            self._cursor.close()
+
+    @property
+    def cursor(self):
+        # cached responses are served without a connection
+        if self._cursor is None:
+            self._cursor = get_connection().cursor()
+        return self._cursor
 
     def get(self, post_id):
         if post_id is None:
-            return jsonify(pg.get_all_data(self.cursor))
-        else:
-            try:
-                result = pg.get_data_by_uuid(self.cursor, post_id)
-            except RuntimeError:
-                abort(404)
-            return jsonify(result)
+            return self.list_posts()
+        return cached_response(response_cache.get_or_build(
+            'post', post_id, lambda: self.render_post(post_id)
+        ))
+
+    def render_post(self, post_id):
+        try:
+            result = pg.get_data_by_uuid(self.cursor, post_id)
+        except RuntimeError:
+            abort(404)
+        return jsonify(result).get_data(), {}
+
+    def list_posts(self):
+        """
+        Returns a page of posts, newest first, `Link` header
+        points to the next one. Posts can be filtered by
+        `post_category`, `username`, `date_from` and `date_to`
+        (YYYY-MM-DD). With `format=ndjson` or NDJSON `Accept` header
+        all matching posts are streamed one per line.
+        """
+        args = request.args
+        try:
+            limit = int(args.get('limit', PAGE_SIZE))
+            after = args.get('after')
+            after = None if after is None else pg.decode_cursor(after)
+            filters = {
+                'post_category': args.get('post_category'),
+                'username': args.get('username'),
+                'date_from': parse_date(args.get('date_from')),
+                'date_to': parse_date(args.get('date_to')),
+            }
+        except ValueError:
+            abort(400, description='Invalid query parameters.')
+        if not 0 < limit <= MAX_PAGE_SIZE:
+            abort(400, description=f'limit must be 1..{MAX_PAGE_SIZE}.')
+
+        if args.get('format') == 'ndjson' or (
+            request.accept_mimetypes.best_match(['application/json', NDJSON])
+            == NDJSON
+        ):
+            posts = pg.iter_posts(get_connection(), after, **filters)
+            return Response(
+                stream_with_context(json.dumps(p) + '\n' for p in posts),
+                mimetype=NDJSON,
+            )
+
+        return cached_response(response_cache.get_or_build(
+            'page', request.url,
+            lambda: self.render_page(limit, after, filters),
+        ))
+
+    def render_page(self, limit, after, filters):
+        posts, next_cursor = pg.get_posts_page(
+            self.cursor, limit, after, **filters
+        )
+        headers = {}
+        if next_cursor is not None:
+            query = urlencode(dict(request.args.items(), after=next_cursor))
+            headers['Link'] = f'<{request.base_url}?{query}>; rel="next"'
+        return jsonify(posts).get_data(), headers
 
     def post(self):
         if not request.json:
@@ -58,11 +193,14 @@ class PostAPI(MethodView):
             abort(400, description='Insufficient data.')
         index = pg.insert_data(self.cursor, data)
         get_connection().commit()
+        # the user upsert changes fields shown in other posts of the user
+        response_cache.clear()
         return jsonify({'post_uuid': index}), 201
 
     def delete(self, post_id):
         pg.delete_data(self.cursor, post_id)
         get_connection().commit()
+        response_cache.invalidate_post(post_id)
         return {}, 200
 
     def put(self, post_id):
@@ -74,15 +212,168 @@ class PostAPI(MethodView):
         except RuntimeError:
             abort(404, description='No such post.')
         get_connection().commit()
+        if USER_KEYS.isdisjoint(data):
+            response_cache.invalidate_post(post_id)
+        else:
+            # user fields are shared by all posts of the user
+            response_cache.clear()
         return {}, 200
 
 
+def bulk_insert():
+    """
+    Inserts a JSON array or NDJSON stream of posts in one transaction,
+    NDJSON is read and written in chunks.
+    """
+    cursor = get_connection().cursor()
+    post_uuids = []
+    chunk = []
+    try:
+        for i, data in enumerate(read_records()):
+            if not isinstance(data, dict) or set(data.keys()) != DATA_KEYS:
+                abort(400, description=f'Insufficient data in post {i}.')
+            chunk.append(data)
+            if len(chunk) == BULK_CHUNK_SIZE:
+                post_uuids += pg.insert_posts(cursor, chunk)
+                chunk = []
+        if chunk:
+            post_uuids += pg.insert_posts(cursor, chunk)
+    except ValueError:
+        abort(400, description='Malformed JSON.')
+    except psycopg2.DataError as e:
+        abort(400, description=str(e).strip())
+    finally:
+        cursor.close()
+    get_connection().commit()
+    # user upserts change fields shown in other posts of the users
+    response_cache.clear()
+    return jsonify({'post_uuids': post_uuids}), 201
+
+
+def read_records():
+    if request.mimetype == NDJSON:
+        for line in request.stream:
+            if line.strip():
+                yield json.loads(line)
+        return
+    data = request.get_json(silent=True)
+    if not isinstance(data, list):
+        abort(400, description='JSON array or NDJSON expected.')
+    yield from data
+
+
+def cached_response(cached: CachedResponse):
+    """
+    Answers 304 if the client has the same version.
+    """
+    if request.if_none_match.contains(cached.etag):
+        response = Response(status=304, headers=cached.headers)
+    else:
+        response = Response(
+            cached.body, mimetype='application/json', headers=cached.headers
+        )
+    response.set_etag(cached.etag)
+    return response
+
+
+def search():
+    """
+    Ranked search by title words `q`, `post_category`
+    and `username` substrings, paginated with `limit` and `offset`.
+    """
+    args = request.args
+    try:
+        limit = int(args.get('limit', PAGE_SIZE))
+        offset = int(args.get('offset', 0))
+    except ValueError:
+        abort(400, description='Invalid query parameters.')
+    if not 0 < limit <= MAX_PAGE_SIZE:
+        abort(400, description=f'limit must be 1..{MAX_PAGE_SIZE}.')
+    if offset < 0:
+        abort(400, description='offset must not be negative.')
+    terms = {
+        key: args.get(key) for key in ('q', 'post_category', 'username')
+    }
+    if not any(terms.values()):
+        abort(400, description='No search terms.')
+
+    def render():
+        with get_connection().cursor() as cursor:
+            posts, more = pg.search_posts(cursor, limit, offset, **terms)
+        headers = {}
+        if more:
+            query = urlencode(dict(args.items(), offset=offset + limit))
+            headers['Link'] = f'<{request.base_url}?{query}>; rel="next"'
+        return jsonify(posts).get_data(), headers
+
+    return cached_response(
+        response_cache.get_or_build('page', request.url, render)
+    )
+
+
+def analytics(name):
+    """
+    Aggregates from summary tables kept by `postgres.create_summaries`:
+    `categories` and `authors` take `limit`,
+    `daily` takes `date_from` and `date_to`.
+    """
+    args = request.args
+    try:
+        limit = int(args.get('limit', PAGE_SIZE))
+        date_from = parse_date(args.get('date_from'))
+        date_to = parse_date(args.get('date_to'))
+    except ValueError:
+        abort(400, description='Invalid query parameters.')
+    if not 0 < limit <= MAX_PAGE_SIZE:
+        abort(400, description=f'limit must be 1..{MAX_PAGE_SIZE}.')
+    queries = {
+        'categories': lambda cursor: pg.get_category_stats(cursor, limit),
+        'authors': lambda cursor: pg.get_top_authors(cursor, limit),
+        'daily': lambda cursor: pg.get_daily_stats(
+            cursor, date_from, date_to
+        ),
+    }
+    if name not in queries:
+        abort(404)
+
+    def render():
+        with get_connection().cursor() as cursor:
+            return jsonify(queries[name](cursor)).get_data(), {}
+
+    # summaries change with posts, so they are cached as pages
+    return cached_response(
+        response_cache.get_or_build('page', request.url, render)
+    )
+
+
+def metrics_view():
+    return Response(
+        metrics.registry.render(),
+        mimetype='text/plain; version=0.0.4',
+    )
+
+
+def cache_stats():
+    return jsonify(response_cache.stats())
+
+
+def parse_date(value):
+    if value is None:
+        return None
+    return datetime.date.fromisoformat(value)
+
+
 post_view = PostAPI.as_view('post_api')
 app.add_url_rule(
     '/posts/', defaults={'post_id': None},
     view_func=post_view, methods=['GET']
 )
 app.add_url_rule('/posts/', view_func=post_view, methods=['POST'])
+app.add_url_rule('/posts/bulk', view_func=bulk_insert, methods=['POST'])
+app.add_url_rule('/cache/stats', view_func=cache_stats, methods=['GET'])
+app.add_url_rule('/metrics', view_func=metrics_view, methods=['GET'])
+app.add_url_rule('/stats/<name>', view_func=analytics, methods=['GET'])
+app.add_url_rule('/posts/search', view_func=search, methods=['GET'])
 app.add_url_rule(
     '/posts/<post_id>', view_func=post_view,
     methods=['GET', 'PUT', 'DELETE']
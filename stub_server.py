@@ -0,0 +1,67 @@
+import argparse
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, quote, urlencode, urlsplit
+
+
+def fixture_name(path: str) -> str:
+    """
+    Returns file name of a recorded response for request `path`,
+    query parameters are sorted so their order does not matter.
+    """
+    parts = urlsplit(path)
+    query = urlencode(sorted(parse_qsl(parts.query)))
+    key = parts.path + ('?' + query if query else '')
+    return quote(key, safe='') + '.json'
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Serves recorded JSON responses from `server.directory`.
+    """
+
+    def do_GET(self):
+        filename = os.path.join(
+            self.server.directory, fixture_name(self.path)
+        )
+        if not os.path.exists(filename):
+            self.send_error(404)
+            return
+        with open(filename, 'rb') as f:
+            body = f.read()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(
+    directory: str, host: str = '127.0.0.1', port: int = 0
+) -> ThreadingHTTPServer:
+    """
+    Starts stub server in a daemon thread,
+    the actual address is in `server.server_address`.
+    """
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    server.directory = directory
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(
+        description='Serves recorded reddit responses'
+    )
+    arg_parser.add_argument('directory')
+    arg_parser.add_argument('--port', type=int, default=8000)
+    args = arg_parser.parse_args()
+
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), StubHandler)
+    server.directory = args.directory
+    server.serve_forever()
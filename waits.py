@@ -0,0 +1,141 @@
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+
+class PageWaiter:
+    """
+    Waits for page readiness with explicit conditions
+    instead of fixed sleeps.
+    Every wait has its own timeout and a bounded number of retries,
+    latency of each wait is recorded under its name.
+    """
+
+    DEFAULT_TIMEOUTS = {
+        'presence': 10.0,
+        'visibility': 5.0,
+        'feed_growth': 10.0,
+    }
+
+    def __init__(
+        self,
+        timeouts: Optional[Dict[str, float]] = None,
+        retries: int = 1,
+        poll_frequency: float = 0.1,
+    ):
+        self.timeouts = dict(self.DEFAULT_TIMEOUTS, **(timeouts or {}))
+        self.retries = retries
+        self.poll_frequency = poll_frequency
+        self.latencies = defaultdict(list)
+        self.timeouts_hit = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def until(
+        self,
+        driver,
+        name: str,
+        condition: Callable[[Any], Any],
+        timeout: Optional[float] = None,
+        on_retry: Optional[Callable[[], None]] = None,
+    ) -> Optional[Any]:
+        """
+        Waits until `condition` returns truthy value and returns it.
+        Calls `on_retry` before each retry and
+        returns None if all attempts timed out.
+        """
+        timeout = timeout or self.timeouts.get(name, 10.0)
+        for attempt in range(self.retries + 1):
+            if attempt and on_retry is not None:
+                on_retry()
+            start = time.perf_counter()
+            try:
+                result = WebDriverWait(
+                    driver, timeout, poll_frequency=self.poll_frequency
+                ).until(condition)
+            except TimeoutException:
+                self._record(name, time.perf_counter() - start, False)
+                continue
+            self._record(name, time.perf_counter() - start, True)
+            return result
+        return None
+
+    def presence(self, driver, element_id: str, **kwargs):
+        return self.until(
+            driver, 'presence',
+            EC.presence_of_element_located((By.ID, element_id)),
+            **kwargs
+        )
+
+    def first_present(
+        self, driver, locators: List[Tuple[str, str]], **kwargs
+    ) -> Optional[Tuple[int, Any]]:
+        """
+        Waits until an element matching any of `locators` is present
+        and returns index of the locator and the element.
+        """
+        def present(driver):
+            for i, locator in enumerate(locators):
+                elements = driver.find_elements(*locator)
+                if elements:
+                    return i, elements[0]
+            return False
+        return self.until(driver, 'presence', present, **kwargs)
+
+    def visibility(self, driver, class_name: str, **kwargs):
+        return self.until(
+            driver, 'visibility',
+            EC.visibility_of_element_located((By.CLASS_NAME, class_name)),
+            **kwargs
+        )
+
+    def feed_growth(
+        self, driver, class_name: str, seen_children: int, **kwargs
+    ) -> Optional[int]:
+        """
+        Waits until feed container has more than `seen_children`
+        children and returns the new number of children.
+        """
+        def grown(driver):
+            count = count_children(driver, class_name)
+            return count if count > seen_children else False
+        return self.until(driver, 'feed_growth', grown, **kwargs)
+
+    def stats(self) -> Dict[str, dict]:
+        with self._lock:
+            return {
+                name: {
+                    'count': len(latencies),
+                    'timeouts': self.timeouts_hit[name],
+                    'mean': sum(latencies) / len(latencies),
+                    'max': max(latencies),
+                }
+                for name, latencies in self.latencies.items()
+            }
+
+    def _record(self, name: str, latency: float, success: bool):
+        with self._lock:
+            self.latencies[name].append(latency)
+            if not success:
+                self.timeouts_hit[name] += 1
+
+
+def count_children(driver, class_name: str) -> int:
+    return driver.execute_script(
+        'const block = document.getElementsByClassName(arguments[0])[0];'
+        'return block ? block.childElementCount : 0;',
+        class_name
+    )
+
+
+def format_stats(stats: Dict[str, dict]) -> List[str]:
+    return [
+        f"{name}: {s['count']} waits, {s['timeouts']} timeouts, "
+        f"mean {s['mean']:.3f}s, max {s['max']:.3f}s"
+        for name, s in stats.items()
+    ]
@@ -0,0 +1,251 @@
+import csv
+import datetime
+import json
+from typing import Callable, List, Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # columnar output is unavailable
+    pa = None
+
+
+OnFlush = Callable[[List[dict]], None]
+
+
+class BatchWriter:
+    """
+    Writes posts to a file in batches of `batch_size` rows,
+    so only one batch is kept in memory.
+    `on_flush` is called with every batch once it is in the file.
+    """
+
+    BATCH_SIZE = 50
+
+    def __init__(
+        self,
+        path: str,
+        columns: List[str],
+        batch_size: Optional[int] = None,
+        on_flush: Optional[OnFlush] = None,
+    ):
+        self.path = path
+        self.columns = columns
+        self.batch_size = batch_size or self.BATCH_SIZE
+        self.on_flush = on_flush
+        self.rows_written = 0
+        self._batch = []
+        self._file = self._open(path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, row: dict):
+        self._batch.append(row)
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        batch = self._batch
+        if batch:
+            self._write_batch(batch)
+            self.rows_written += len(batch)
+            self._batch = []
+        self._flush_file()
+        if batch:
+            self._flushed(batch)
+
+    def close(self):
+        if self._file is not None:
+            self.flush()
+            self._file.close()
+            self._file = None
+
+    def _open(self, path: str):
+        return open(path, 'w', newline='')
+
+    def _flush_file(self):
+        self._file.flush()
+
+    def _flushed(self, rows: List[dict]):
+        if self.on_flush is not None:
+            self.on_flush(rows)
+
+    def _write_batch(self, rows: List[dict]):
+        raise NotImplementedError
+
+
+class CsvWriter(BatchWriter):
+    """
+    Writes `sep`-separated CSV with a header,
+    in the same format as `DataFrame.to_csv(sep=';', index=False)`.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        columns: List[str],
+        batch_size: Optional[int] = None,
+        on_flush: Optional[OnFlush] = None,
+        sep: str = ';',
+    ):
+        super().__init__(path, columns, batch_size, on_flush)
+        self._writer = csv.DictWriter(
+            self._file, columns, delimiter=sep,
+            extrasaction='ignore', lineterminator='\n'
+        )
+        self._writer.writeheader()
+
+    def _write_batch(self, rows: List[dict]):
+        self._writer.writerows(rows)
+
+
+class NdjsonWriter(BatchWriter):
+    """
+    Writes one JSON object per line.
+    """
+
+    def _write_batch(self, rows: List[dict]):
+        self._file.writelines(
+            json.dumps({column: row.get(column) for column in self.columns})
+            + '\n'
+            for row in rows
+        )
+
+
+class ColumnarWriter(BatchWriter):
+    """
+    Base of Arrow based writers, every batch is converted
+    to a table with `POSTS_SCHEMA` and appended to the file.
+    """
+
+    BATCH_SIZE = 1000
+
+    def __init__(
+        self,
+        path: str,
+        columns: List[str],
+        batch_size: Optional[int] = None,
+        on_flush: Optional[OnFlush] = None,
+    ):
+        if pa is None:
+            raise ImportError('pyarrow is required for columnar output')
+        self.schema = pa.schema([
+            POSTS_SCHEMA.field(column) for column in columns
+        ])
+        super().__init__(path, columns, batch_size, on_flush)
+
+    def _flush_file(self):
+        pass  # every batch is written as a whole
+
+    def _write_batch(self, rows: List[dict]):
+        self._file.write_table(posts_to_table(rows, self.schema))
+
+
+class ParquetWriter(ColumnarWriter):
+    """
+    Writes Parquet file, one row group per batch.
+    The file is readable only after `close` writes its footer,
+    so `on_flush` is called for all batches then.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._unreported = []
+        super().__init__(*args, **kwargs)
+
+    def close(self):
+        if self._file is None:
+            return
+        super().close()
+        for rows in self._unreported:
+            super()._flushed(rows)
+        self._unreported = []
+
+    def _open(self, path: str):
+        return pq.ParquetWriter(path, self.schema)
+
+    def _flushed(self, rows: List[dict]):
+        self._unreported.append(rows)
+
+
+class ArrowWriter(ColumnarWriter):
+    """
+    Writes Arrow IPC stream, one record batch per batch.
+    Stream format is used as dictionaries differ between batches.
+    The file can be read zero-copy with
+    `pa.ipc.open_stream(pa.memory_map(path))`.
+    """
+
+    def _open(self, path: str):
+        return pa.ipc.new_stream(path, self.schema)
+
+
+def posts_schema():
+    """
+    Typed schema of parser output: int64 counts, date32 dates,
+    dictionary encoded usernames and categories.
+    """
+    dictionary = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema([
+        ('post_uuid', pa.string()),
+        ('url', pa.string()),
+        ('username', dictionary),
+        ('user_karma', pa.int64()),
+        ('user_cakeday', pa.date32()),
+        ('post_karma', pa.int64()),
+        ('comment_karma', pa.int64()),
+        ('post_date', pa.date32()),
+        ('comments_number', pa.int64()),
+        ('votes_number', pa.int64()),
+        ('post_category', dictionary),
+    ])
+
+
+POSTS_SCHEMA = posts_schema() if pa is not None else None
+DATE_FORMAT = '%d-%m-%y'
+
+
+def posts_to_table(rows: List[dict], schema=None) -> 'pa.Table':
+    schema = schema or POSTS_SCHEMA
+    columns = {}
+    for field in schema:
+        values = [row.get(field.name) for row in rows]
+        if pa.types.is_date32(field.type):
+            values = [parse_date(value) for value in values]
+        columns[field.name] = pa.array(values, type=field.type)
+    return pa.table(columns, schema=schema)
+
+
+def parse_date(value) -> Optional[datetime.date]:
+    """
+    Returns None for dates which are not in `DATE_FORMAT`.
+    """
+    if value is None or isinstance(value, datetime.date):
+        return value
+    try:
+        return datetime.datetime.strptime(value, DATE_FORMAT).date()
+    except (TypeError, ValueError):
+        return None
+
+
+WRITERS = {
+    'csv': CsvWriter,
+    'ndjson': NdjsonWriter,
+    'parquet': ParquetWriter,
+    'arrow': ArrowWriter,
+}
+
+
+def get_writer(
+    fmt: str,
+    path: str,
+    columns: List[str],
+    batch_size: Optional[int] = None,
+    on_flush: Optional[OnFlush] = None,
+) -> BatchWriter:
+    if fmt not in WRITERS:
+        raise ValueError(f'Unknown output format: {fmt}')
+    return WRITERS[fmt](path, columns, batch_size, on_flush)